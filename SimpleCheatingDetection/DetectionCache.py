@@ -0,0 +1,85 @@
+import json
+import os
+import threading
+import uuid
+
+import numpy as np
+
+from DetectionLog import DetectionLog, RECORD_DTYPE
+from ResultCache import ResultCache, evict_lru, file_digest
+
+
+class DetectionCache:
+    """
+    Raw per-frame model outputs of a video, one compressed NumPy archive per
+    (video content, skip_frames, backend). The archive holds the session's
+    DetectionLog rows (RECORD_DTYPE, one per sampled frame) and the face
+    class names their face_class indices refer to. Boxes, lid distances and
+    eye-model probabilities do not depend on eye_closure_threshold or
+    closed_eye_cheat_time, so intervals for new thresholds are rebuilt from
+    them without running any model; the stored eye directions and times are
+    recomputed on replay. Like ResultCache, a hit refreshes the archive's
+    mtime and saves evict the least recently used archives once the directory
+    grows past max_bytes.
+    """
+
+    def __init__(self, cache_dir: str = "cache/detections", max_bytes: int = 1024 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, video_path: str, skip_frames: int, backend: str, *variant) -> str:
+        # variant names any detector options that change the detections, e.g. ("roi", margin, refresh)
+        return ResultCache.key("detections", file_digest(video_path), skip_frames, backend, *variant)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key + ".npz")
+
+    def save(self, key: str, log, fps: float, frame_count: int):
+        """Stores a DetectionLog's rows."""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._path(key)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp.npz"
+        np.savez_compressed(
+            tmp_path,
+            records=log.view(),
+            face_classes=np.array(json.dumps(log.face_classes)),
+            fps=np.array(fps, dtype=np.float64),
+            frame_count=np.array(frame_count, dtype=np.int64)
+        )
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            evict_lru(self.cache_dir, self.max_bytes, ".npz")
+
+    def load(self, key: str):
+        """Returns (DetectionLog, fps, frame_count), or None when the video has not been analyzed."""
+        path = self._path(key)
+        try:
+            data = np.load(path)
+            with data:
+                records = data["records"]
+                face_classes = json.loads(str(data["face_classes"]))
+                fps = float(data["fps"])
+                frame_count = int(data["frame_count"])
+            os.utime(path)
+        # KeyError: an archive written in an older layout, which is analyzed again
+        except (OSError, ValueError, KeyError):
+            self.misses += 1
+            return None
+        if records.dtype != RECORD_DTYPE:
+            self.misses += 1
+            return None
+        self.hits += 1
+
+        log = DetectionLog()
+        log.extend(records, face_classes)
+        return log, fps, frame_count
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses}
+
+
+DETECTION_CACHE = DetectionCache()
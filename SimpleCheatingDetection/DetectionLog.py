@@ -0,0 +1,129 @@
+import os
+import tempfile
+import weakref
+
+import numpy as np
+
+
+# One row per sampled frame, 82 bytes each: the raw model outputs, enough to rebuild
+# the frame's detection, plus the eye directions the session derived from them
+RECORD_DTYPE = np.dtype([
+    ("frame", np.int32),
+    ("time", np.float64),             # seconds into the video
+    ("face_class", np.int8),          # index into DetectionLog.face_classes; -1 without a face box
+    ("head_tilt", np.bool_),
+    ("left_dir", np.int8),            # IntervalEngine direction codes, after carry-over
+    ("right_dir", np.int8),
+    ("left_open", np.float64),        # lid distance ratio; NaN without landmarks. Full precision,
+    ("right_open", np.float64),       # so re-thresholding a replay decides as the live run did
+    ("face_box", np.int16, (4,)),     # x1, y1, x2, y2; -1 without a face box
+    ("eye_box", np.int16, (2, 4)),    # left/right eye boxes; -1 without landmarks
+    ("eye_probs", np.float32, (2, 3)),  # eye-model probabilities; NaN when not classified
+    ("person", np.int16),             # multi-face mode: the candidate's track ID; -1 otherwise
+])
+
+# Field values for a frame without a face box, landmarks or classified eye
+NO_BOX = (-1, -1, -1, -1)
+NO_EYE_BOXES = (NO_BOX, NO_BOX)
+NO_PROBS = (np.nan, np.nan, np.nan)
+
+
+class DetectionLog:
+    """
+    Per-video record of every sampled frame in preallocated structured-array
+    chunks, so appends are O(1) and never copy earlier rows. Once more than
+    max_memory_rows rows are held, the full chunks are written to a spill
+    file and dropped from memory; view() then returns a read-only memory map.
+    """
+
+    def __init__(self, chunk_rows=4096, max_memory_rows=1 << 20, spill_dir=None):
+        self.chunk_rows = chunk_rows
+        self.max_memory_rows = max(chunk_rows, max_memory_rows)
+        self.spill_dir = spill_dir
+        # Face class names, in the order their indices were handed out
+        self.face_classes = []
+
+        self._chunks = [np.empty(chunk_rows, dtype=RECORD_DTYPE)]
+        self._fill = 0       # rows used in the last chunk
+        self._spilled = 0    # rows already in the spill file
+        self._spill_path = None
+
+    def __len__(self):
+        return self._spilled + (len(self._chunks) - 1) * self.chunk_rows + self._fill
+
+    def face_class_index(self, name):
+        if name is None:
+            return -1
+        if name not in self.face_classes:
+            self.face_classes.append(name)
+        return self.face_classes.index(name)
+
+    def append(self, frame, time, face_class, head_tilt, left_dir, right_dir, left_open, right_open,
+               face_box=NO_BOX, eye_box=NO_EYE_BOXES, eye_probs=(NO_PROBS, NO_PROBS), person=-1):
+        if self._fill == self.chunk_rows:
+            self._next_chunk()
+        self._chunks[-1][self._fill] = (frame, time, face_class, head_tilt, left_dir, right_dir, left_open, right_open,
+                                        face_box, eye_box, eye_probs, person)
+        self._fill += 1
+
+    def extend(self, records, face_classes=None):
+        """
+        Appends a structured array of RECORD_DTYPE rows. `face_classes` is the
+        class list their face_class indices refer to, when it is another log's.
+        """
+        if face_classes is not None and list(face_classes) != self.face_classes:
+            # The trailing -1 keeps "no face box" rows at -1
+            mapping = np.array([self.face_class_index(name) for name in face_classes] + [-1], dtype=np.int8)
+            records = records.copy()
+            records["face_class"] = mapping[records["face_class"]]
+
+        start = 0
+        while start < len(records):
+            if self._fill == self.chunk_rows:
+                self._next_chunk()
+            n = min(self.chunk_rows - self._fill, len(records) - start)
+            self._chunks[-1][self._fill:self._fill + n] = records[start:start + n]
+            self._fill += n
+            start += n
+
+    def _next_chunk(self):
+        if len(self._chunks) * self.chunk_rows >= self.max_memory_rows:
+            self._spill()
+        else:
+            self._chunks.append(np.empty(self.chunk_rows, dtype=RECORD_DTYPE))
+            self._fill = 0
+
+    def _spill(self):
+        # Every row held in memory goes to the end of the spill file
+        if self._spill_path is None:
+            fd, self._spill_path = tempfile.mkstemp(prefix="detection_log_", suffix=".bin", dir=self.spill_dir)
+            os.close(fd)
+            weakref.finalize(self, _remove_quietly, self._spill_path)
+        with open(self._spill_path, "ab") as f:
+            for chunk in self._chunks[:-1]:
+                chunk.tofile(f)
+            self._chunks[-1][:self._fill].tofile(f)
+        self._spilled = len(self)
+        self._chunks = [self._chunks[-1]]
+        self._fill = 0
+
+    def view(self):
+        """
+        All rows as one structured array: a copy while the log fits in memory,
+        a read-only memory map of the spill file once it has spilled.
+        """
+        if self._spill_path is None:
+            return np.concatenate(self._chunks[:-1] + [self._chunks[-1][:self._fill]])
+        if self._fill or len(self._chunks) > 1:
+            self._spill()
+        return np.memmap(self._spill_path, dtype=RECORD_DTYPE, mode="r", shape=(self._spilled,))
+
+    def memory_bytes(self):
+        return sum(chunk.nbytes for chunk in self._chunks)
+
+
+def _remove_quietly(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
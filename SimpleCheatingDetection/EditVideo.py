@@ -1,16 +1,30 @@
-from SimpleCheatingDetector import SimpleCheatingDetector
 from moviepy.video.io.VideoFileClip import VideoFileClip
 from moviepy.audio.io.AudioFileClip import AudioFileClip
 from moviepy.video.compositing.CompositeVideoClip import concatenate_videoclips
+import math
 import os
+import re
+import shutil
+import subprocess
+import tempfile
 import time
 from typing import List
 import uuid
 from moviepy import clips_array
+from MediaGraph import ffmpeg_exe, probe, clamp_cuts, select_expr
 
 
 start_time = time.time()
 
+# Codecs smart_render can splice: encoder for the partial GOPs at each edge, and the
+# Annex B bitstream filter that puts parameter sets in-band in front of every keyframe,
+# so each re-encoded edge and stream-copied run of GOPs brings its own when they are
+# joined. Edges are short, so they are encoded near-lossless to blend in with the copied frames.
+SMART_RENDER_CODECS = {
+    "h264": (["-c:v", "libx264", "-preset", "veryfast", "-crf", "16"], "h264_mp4toannexb"),
+    "hevc": (["-c:v", "libx265", "-preset", "veryfast", "-crf", "16"], "hevc_mp4toannexb"),
+}
+
 
 class Video:
     def __init__(self):
@@ -20,7 +34,8 @@ class Video:
         self,
         process_video_input: str="sampled_videos/input_video.mp4",
         final_output_path: str="edited_videos/output.mp4",
-        cuts: List[tuple]=[(10, 20), (30, 40)]  # Example intervals for testing
+        cuts: List[tuple]=[(10, 20), (30, 40)],  # Example intervals for testing
+        smart_render: bool=False
     ):
         print("Cheating Intervals (in seconds):", cuts)
 
@@ -28,6 +43,14 @@ class Video:
             print("No cheating intervals detected — nothing to export.")
             return
 
+        if smart_render:
+            try:
+                output_path = self._smart_cut(process_video_input, final_output_path, cuts)
+                if output_path:
+                    return output_path
+            except Exception as e:
+                print(f"Smart render failed, re-encoding instead: {e}")
+
         try:
             video = VideoFileClip(process_video_input)
             duration = video.duration
@@ -72,7 +95,141 @@ class Video:
             if 'video' in locals(): video.close()
             if 'final_clip' in locals(): final_clip.close()
             return None
-            
+
+    def _keyframe_times(self, video_path: str):
+        # Only keyframes are decoded, so this stays fast on long recordings
+        proc = subprocess.run(
+            [ffmpeg_exe(), "-hide_banner", "-skip_frame", "nokey", "-i", video_path,
+             "-map", "0:v:0", "-vf", "showinfo", "-f", "null", "-"],
+            capture_output=True, text=True
+        )
+        return [float(t) for t in re.findall(r"pts_time:([\d.]+)", proc.stderr)]
+
+    def _reorder_depth(self, video_path: str):
+        """
+        How many frames a packet can be decoded ahead of its display slot (0
+        without B-frames), or None when the stream has open GOPs: a packet
+        decoded after a keyframe but shown before it cannot be cut there.
+        Only packet timestamps are read, nothing is decoded.
+        """
+        proc = subprocess.run(
+            [ffmpeg_exe(), "-hide_banner", "-loglevel", "error", "-i", video_path,
+             "-map", "0:v:0", "-c", "copy", "-f", "framecrc", "-"],
+            capture_output=True, text=True, check=True
+        )
+        # framecrc rows: stream, dts, pts, duration, size, checksum[, F=flags]; keyframes carry no flags
+        pts, keys = [], []
+        for line in proc.stdout.splitlines():
+            if line and not line.startswith("#"):
+                fields = line.split(",")
+                pts.append(int(fields[2]))
+                keys.append(len(fields) == 6)
+
+        last_key = None
+        for ts, key in zip(pts, keys):
+            if key:
+                last_key = ts
+            elif last_key is not None and ts < last_key:
+                return None
+
+        # Decode position minus display position, at its largest
+        display = {i: rank for rank, i in enumerate(sorted(range(len(pts)), key=pts.__getitem__))}
+        return max((i - display[i] for i in range(len(pts))), default=0)
+
+    def _smart_cut(self, video_path: str, final_output_path: str, cuts):
+        """
+        Cuts `cuts` out of the video without re-encoding whole intervals: the
+        GOPs between the first and last keyframe of each interval are stream
+        copied and only the partial GOPs at its edges are re-encoded. Audio is
+        cut and encoded in the same pass as the final concat. Returns None
+        when the stream cannot be spliced (another codec, or open GOPs), so
+        the caller can re-encode.
+        """
+        info = probe(video_path)
+        if info.video_codec not in SMART_RENDER_CODECS:
+            print(f"Smart render does not support {info.video_codec} video; re-encoding instead.")
+            return None
+        depth = self._reorder_depth(video_path)
+        if depth is None:
+            print("Smart render does not support video with open GOPs; re-encoding instead.")
+            return None
+        encoder, annexb = SMART_RENDER_CODECS[info.video_codec]
+
+        segments = clamp_cuts(cuts, info.duration)
+        if not segments:
+            return None
+
+        fps = info.fps
+        keyframes = self._keyframe_times(video_path)
+
+        # (start, end, copy) pieces covering each interval back to back
+        pieces = []
+        for start, end in segments:
+            inner = [k for k in keyframes if start <= k <= end]
+            if len(inner) >= 2:
+                pieces += [(start, inner[0], False), (inner[0], inner[-1], True), (inner[-1], end, False)]
+            else:
+                pieces.append((start, end, False))
+
+        work_dir = tempfile.mkdtemp(prefix="smart_cut_")
+        try:
+            part_paths = []
+            copied = 0.0
+            for start, end, copy in pieces:
+                # Frames whose timestamps fall in [start, end)
+                first = math.ceil(start * fps - 1e-6)
+                frames = math.ceil(end * fps - 1e-6) - first
+                if frames <= 0:
+                    continue
+
+                if copy:
+                    # Seeking just past the keyframe still lands on it, and stream copy starts there.
+                    # GOPs are closed, so the first `frames` packets are exactly this piece's frames
+                    seek = (first + 0.25) / fps
+                    codec = ["-c:v", "copy"]
+                    bsf = annexb
+                    copied += end - start
+                else:
+                    # Half a frame early, as the probed rate is rounded (29.97); pieces keep their
+                    # own timestamps, so nothing pads the gap. No B-frames, so decode order is display order
+                    seek = max(first - 0.5, 0) / fps
+                    codec = [*encoder, "-bf", "0", "-pix_fmt", "yuv420p"]
+                    # The encoder keeps its parameter sets in the container header; repeat them in-band
+                    bsf = "dump_extra=freq=keyframe"
+
+                # Pieces are joined by the concat demuxer, which lines up their first frames.
+                # Decode timestamps are set `depth` frames ahead of the first frame in every
+                # piece, copied GOPs and re-encoded edges alike, so they keep increasing across
+                # the joins and never pass a frame's presentation time
+                setts = f"setts=dts=DTS-STARTDTS+STARTPTS-{depth / fps:.6f}/TB"
+                part_path = os.path.join(work_dir, f"{len(part_paths):04d}.mkv")
+                subprocess.run(
+                    [ffmpeg_exe(), "-hide_banner", "-loglevel", "error", "-y",
+                     "-ss", f"{seek:.6f}", "-i", video_path, "-map", "0:v:0", "-frames:v", str(frames),
+                     *codec, "-bsf:v", f"{bsf},{setts}", part_path],
+                    check=True, capture_output=True
+                )
+                part_paths.append(part_path)
+
+            list_path = os.path.join(work_dir, "pieces.txt")
+            with open(list_path, "w") as f:
+                f.writelines(f"file '{path}'\n" for path in part_paths)
+
+            cmd = [ffmpeg_exe(), "-hide_banner", "-loglevel", "error", "-y",
+                   "-f", "concat", "-safe", "0", "-i", list_path, "-i", video_path,
+                   "-map", "0:v", "-c:v", "copy"]
+            if info.has_audio:
+                cmd += ["-filter_complex", f"[1:a]aselect='{select_expr(segments)}',asetpts=N/SR/TB[a]",
+                        "-map", "[a]", "-c:a", "aac"]
+            os.makedirs(os.path.dirname(final_output_path) or ".", exist_ok=True)
+            subprocess.run(cmd + [final_output_path], check=True, capture_output=True)
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+        total = sum(end - start for start, end in segments)
+        print(f"Smart render: copied {copied:.1f}s of {total:.1f}s, re-encoded {total - copied:.1f}s")
+        return final_output_path
+
     def mute_audio(self, video_path: str):
         clip = VideoFileClip(video_path)
         video_no_audio = clip.without_audio()
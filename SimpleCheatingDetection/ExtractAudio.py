@@ -1,8 +1,15 @@
 from moviepy.video.io.VideoFileClip import VideoFileClip
 from pydub import AudioSegment
+from MediaGraph import ffmpeg_exe, probe
+import numpy as np
 import os
+import subprocess
+import tempfile
 import uuid
 
+# Probed container durations can run a little past the audio stream itself
+DURATION_TOLERANCE = 1.0
+
 class Audio:
     def extract_audio(self, video_path: str):
         try:
@@ -47,7 +54,122 @@ class Audio:
         
         except Exception as e:
             print(f"Error overlaying audio: {e}")
-    
+
+    def _decode_pcm(self, video_path: str, sample_rate: int, channels: int):
+        # float32 PCM on stdout, resampled so both tracks line up sample for sample.
+        # stderr goes to a file so a chatty decoder can't block on a full pipe
+        errors = tempfile.TemporaryFile()
+        proc = subprocess.Popen(
+            [ffmpeg_exe(), "-hide_banner", "-loglevel", "error", "-i", video_path, "-map", "0:a:0", "-vn",
+             "-f", "f32le", "-ar", str(sample_rate), "-ac", str(channels), "-"],
+            stdout=subprocess.PIPE, stderr=errors
+        )
+        proc.errors = errors
+        return proc
+
+    def _finish_decoder(self, proc, video_path: str, drained: bool):
+        # A decoder stopped before its end (the second track outlasting the
+        # first, or an error elsewhere) is killed and its exit code ignored
+        if not drained:
+            proc.kill()
+        proc.stdout.close()
+        returncode = proc.wait()
+        proc.errors.seek(0)
+        stderr = proc.errors.read().decode(errors="replace").strip()
+        proc.errors.close()
+        if drained and returncode != 0:
+            raise RuntimeError(f"ffmpeg could not decode the audio of {video_path}: {stderr}")
+
+    def mix_audio(self, video1_path: str, video2_path: str, chunk_seconds: float = 5.0):
+        """
+        Streaming replacement for extract_audio + overlay_audio: decodes both
+        audio tracks straight from the videos, sums them chunk by chunk and
+        encodes the mix once. Memory stays at a few chunks however long the
+        session is. Like AudioSegment.overlay, the result is as long as the
+        first track, the second is padded with silence, and sums saturate.
+        Probe and ffmpeg errors are raised to the caller, as is a track that
+        decodes to less audio than its probed duration (a truncated file).
+        """
+        info1 = probe(video1_path)
+        info2 = probe(video2_path)
+        if not info1.has_audio:
+            raise ValueError(f"No audio track in {video1_path}")
+
+        # pydub overlays at the higher rate and channel count of the two
+        sample_rate = max(info1.sample_rate or 0, info2.sample_rate or 0)
+        channels = max(info1.channels or 0, info2.channels or 0)
+        if not sample_rate or not channels:
+            raise ValueError(f"Could not read the audio format of {video1_path}")
+        chunk_bytes = int(chunk_seconds * sample_rate) * channels * 4
+
+        random_id = str(uuid.uuid4())
+        output_audio_path = f"final_audio/{random_id}_audio.mp3"
+        os.makedirs(os.path.dirname(output_audio_path), exist_ok=True)
+
+        decoder1 = self._decode_pcm(video1_path, sample_rate, channels)
+        decoder2 = self._decode_pcm(video2_path, sample_rate, channels) if info2.has_audio else None
+        encoder = subprocess.Popen(
+            [ffmpeg_exe(), "-hide_banner", "-loglevel", "error", "-y",
+             "-f", "f32le", "-ar", str(sample_rate), "-ac", str(channels), "-i", "-",
+             "-c:a", "libmp3lame", output_audio_path],
+            stdin=subprocess.PIPE, stderr=subprocess.DEVNULL
+        )
+
+        read1 = read2 = 0
+        drained1 = drained2 = False
+        try:
+            while True:
+                data1 = decoder1.stdout.read(chunk_bytes)
+                if not data1:
+                    drained1 = True
+                    break
+                read1 += len(data1)
+                mixed = np.frombuffer(data1, dtype=np.float32).copy()
+
+                # Second track: add what it has for this chunk, silence once it ends
+                if decoder2 is not None:
+                    data2 = decoder2.stdout.read(len(data1))
+                    drained2 = len(data2) < len(data1)
+                    if data2:
+                        read2 += len(data2)
+                        mixed[:len(data2) // 4] += np.frombuffer(data2, dtype=np.float32)
+
+                np.clip(mixed, -1.0, 1.0, out=mixed)
+                encoder.stdin.write(mixed.tobytes())
+        finally:
+            encoder.stdin.close()
+            failures = []
+            for proc, path, drained in ((decoder1, video1_path, drained1), (decoder2, video2_path, drained2)):
+                if proc is not None:
+                    try:
+                        self._finish_decoder(proc, path, drained)
+                    except RuntimeError as e:
+                        failures.append(str(e))
+            encoded = encoder.wait()
+
+        if failures:
+            raise RuntimeError("; ".join(failures))
+        if encoded != 0:
+            raise RuntimeError("ffmpeg could not encode the mixed audio")
+
+        # A truncated file can decode cleanly and just stop early
+        bytes_per_second = sample_rate * channels * 4
+        seconds1 = read1 / bytes_per_second
+        if seconds1 < info1.duration - DURATION_TOLERANCE:
+            raise RuntimeError(
+                f"Decoded {seconds1:.1f}s of audio from {video1_path}, expected {info1.duration:.1f}s")
+        if decoder2 is not None:
+            # Only the part that overlaps the first track is read
+            seconds2 = read2 / bytes_per_second
+            expected2 = min(info2.duration, seconds1)
+            if seconds2 < expected2 - DURATION_TOLERANCE:
+                raise RuntimeError(
+                    f"Decoded {seconds2:.1f}s of audio from {video2_path}, expected {expected2:.1f}s")
+
+        print(f"Mixed audio saved to {output_audio_path}")
+
+        return output_audio_path
+
 if __name__ == "__main__":
     audio_processor = Audio()
     audio1_path = audio_processor.extract_audio("sampled_videos/recording_local_1769263329508.mp4")
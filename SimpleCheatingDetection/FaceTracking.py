@@ -0,0 +1,76 @@
+import numpy as np
+
+
+def box_iou(boxes_a, boxes_b):
+    """(n, m) intersection-over-union of two lists of x1, y1, x2, y2 boxes."""
+    a = np.asarray(boxes_a, dtype=np.float64).reshape(-1, 4)
+    b = np.asarray(boxes_b, dtype=np.float64).reshape(-1, 4)
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return inter / np.maximum(area_a[:, None] + area_b[None, :] - inter, 1e-9)
+
+
+class FaceTracker:
+    """
+    Gives the faces of successive sampled frames stable IDs by greedily
+    matching each face box to the live track it overlaps most. A track
+    that goes unmatched for more than max_age frames is retired; its ID is
+    never handed out again. The candidate (primary) keeps its track for as
+    long as that track lives.
+    """
+
+    def __init__(self, iou_threshold=0.3, max_age=60):
+        self.iou_threshold = iou_threshold
+        self.max_age = max_age
+        # track id -> [last box, last frame seen, frames seen with landmarks]
+        self.tracks = {}
+        self.next_id = 0
+        self.primary_id = None
+
+    def update(self, frame_count, boxes, has_landmarks=None):
+        """
+        Returns the track ID of each box, in order. has_landmarks tells which
+        boxes MediaPipe found a face in (all by default); only those count
+        towards a track becoming the candidate.
+        """
+        if has_landmarks is None:
+            has_landmarks = [True] * len(boxes)
+        for track_id in [t for t, (_, seen, _) in self.tracks.items() if frame_count - seen > self.max_age]:
+            del self.tracks[track_id]
+
+        ids = [None] * len(boxes)
+        track_ids = list(self.tracks)
+        if boxes and track_ids:
+            iou = box_iou([box[:4] for box in boxes], [self.tracks[t][0] for t in track_ids])
+            # Best remaining pair first; a handful of faces keeps this cheap
+            for flat in np.argsort(iou, axis=None)[::-1]:
+                i, j = divmod(int(flat), len(track_ids))
+                if iou[i, j] < self.iou_threshold:
+                    break
+                if ids[i] is None and track_ids[j] not in ids:
+                    ids[i] = track_ids[j]
+
+        for i, box in enumerate(boxes):
+            if ids[i] is None:
+                ids[i] = self.next_id
+                self.tracks[ids[i]] = [None, frame_count, 0]
+                self.next_id += 1
+            track = self.tracks[ids[i]]
+            track[0], track[1], track[2] = tuple(box[:4]), frame_count, track[2] + bool(has_landmarks[i])
+        return ids
+
+    def primary(self):
+        """
+        The candidate's track ID. It is kept until the track retires, so the
+        identities never swap mid-video; a new one is the live track with
+        landmarks in the most frames. None until some track has landmarks.
+        """
+        if self.primary_id not in self.tracks:
+            candidates = [t for t in self.tracks if self.tracks[t][2]]
+            self.primary_id = max(candidates, key=lambda t: (self.tracks[t][2], -t), default=None)
+        return self.primary_id
@@ -0,0 +1,106 @@
+import math
+import cv2
+
+
+# Eye and head state of a sampled frame that needs no closer look
+CALM_STATE = (False, "center", "center")
+
+
+class FixedSampler:
+    """Every skip_frames-th frame, the detector's original stride."""
+
+    def __init__(self, skip_frames):
+        self.skip_frames = skip_frames
+        self.analyzed = 0
+
+    def probes(self, frame_count):
+        """Whether this frame must be decoded to decide on it; other frames are skipped outright."""
+        return frame_count % self.skip_frames == 0
+
+    def sample(self, frame_count, frame):
+        self.analyzed += 1
+        return True
+
+    def observe(self, frame_count, state):
+        pass
+
+    def report(self, frame_count):
+        return f"Sampling: analyzed {self.analyzed} of {frame_count} frames (every {self.skip_frames}th)"
+
+
+class AdaptiveSampler:
+    """
+    Picks frames from cheap motion on a thumbnail and from the detector's own
+    state. Still "center" stretches are sampled every max_stride frames;
+    motion, or a state change or anything other than a calm state in the
+    recent samples, makes it sample every min_stride frames for `hold` frames.
+    A token bucket caps the total at `budget` times the fixed-stride count,
+    plus a burst of `burst` samples.
+    """
+
+    def __init__(self, skip_frames, budget=1.0, motion_threshold=4.0, min_stride=None, max_stride=None,
+                 hold=None, burst=8, thumb_width=64):
+        self.skip_frames = skip_frames
+        # Samples allowed per frame
+        self.rate = budget / skip_frames
+        self.motion_threshold = motion_threshold
+        self.min_stride = min_stride or max(1, skip_frames // 3)
+        # The forced samples of still stretches must fit in the budget on their own
+        self.max_stride = max(max_stride or 3 * skip_frames, math.ceil(1 / self.rate), self.min_stride)
+        self.hold = hold or 2 * self.max_stride
+        self.burst = burst
+        self.thumb_width = thumb_width
+
+        self.tokens = float(burst)
+        self.last_probe = 0
+        self.last_sample = 0
+        self.last_thumb = None
+        self.last_state = CALM_STATE
+        self.active_until = 0
+        self.analyzed = 0
+        self.motion_samples = 0
+
+    def probes(self, frame_count):
+        return frame_count % self.min_stride == 0
+
+    def _thumbnail(self, frame):
+        h, w = frame.shape[:2]
+        size = (self.thumb_width, max(1, round(h * self.thumb_width / w)))
+        # Shrink first, so the grayscale conversion touches a few thousand pixels
+        return cv2.cvtColor(cv2.resize(frame, size, interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2GRAY)
+
+    def sample(self, frame_count, frame):
+        self.tokens = min(self.burst, self.tokens + self.rate * (frame_count - self.last_probe))
+        self.last_probe = frame_count
+
+        thumb = self._thumbnail(frame)
+        # Mean absolute gray-level change since the previous probe
+        moving = self.last_thumb is not None and cv2.norm(thumb, self.last_thumb, cv2.NORM_L1) / thumb.size >= self.motion_threshold
+        self.last_thumb = thumb
+
+        if frame_count - self.last_sample >= self.max_stride:
+            take = True
+        elif (moving or frame_count < self.active_until) and self.tokens >= 1:
+            take = True
+            self.motion_samples += moving
+        else:
+            take = False
+
+        if take:
+            # Forced samples may overdraw the bucket; the budget rate pays it back
+            self.tokens -= 1
+            self.last_sample = frame_count
+            self.analyzed += 1
+        return take
+
+    def observe(self, frame_count, state):
+        """Feeds back (head tilt, left eye, right eye) of a sampled frame once it has been analyzed."""
+        if state != self.last_state or state != CALM_STATE:
+            self.active_until = frame_count + self.hold
+        self.last_state = state
+
+    def report(self, frame_count):
+        fixed = frame_count // self.skip_frames
+        share = f" ({self.analyzed / fixed:.0%})" if fixed else ""
+        return (f"Adaptive sampling: analyzed {self.analyzed} of {frame_count} frames vs {fixed} at a fixed "
+                f"stride of {self.skip_frames}{share}; {self.motion_samples} taken for motion")
@@ -0,0 +1,114 @@
+import numpy as np
+from MergeIntervals import IntervalSet
+
+
+# Eye direction codes; the first three follow CLASS_LABELS in SimpleCheatingDetector
+CENTER, LEFT, RIGHT, CLOSED = 0, 1, 2, 3
+DIRECTIONS = ("center", "left", "right", "closed")
+
+
+def detection_signals(detections):
+    """
+    Per-sample arrays from FrameDetections, in the layout of DetectionLog's
+    columns: frame numbers, head-tilt flags, (n, 2) lid heights (NaN without
+    landmarks) and (n, 2, 3) eye-model probabilities (NaN when not classified).
+    """
+    n = len(detections)
+    frames = np.fromiter((det.frame_count for det in detections), dtype=np.int64, count=n)
+    head_tilt = np.fromiter((bool(det.has_head_tilt) for det in detections), dtype=bool, count=n)
+    eye_height = np.full((n, 2), np.nan, dtype=np.float64)
+    eye_probs = np.full((n, 2, 3), np.nan, dtype=np.float32)
+
+    for i, det in enumerate(detections):
+        if det.left_height is not None:
+            eye_height[i] = (det.left_height, det.right_height)
+            for side, probs in enumerate((det.left_probs, det.right_probs)):
+                if probs is not None:
+                    eye_probs[i, side] = probs
+
+    return frames, head_tilt, eye_height, eye_probs
+
+
+class IntervalEngine:
+    """
+    Vectorized version of DetectionSession's head-tilt, closed-eye and gaze
+    state machines. Works on whole per-sample arrays at once: labels are
+    run-length encoded, runs are kept by the same duration rules, and the
+    result is the same frame intervals and padded, merged seconds.
+    """
+
+    def __init__(self, fps, closed_eye_cheat_time=4.0, eye_closure_threshold=0.009, padding=10.0):
+        self.fps = fps
+        self.closed_eye_cheat_time = closed_eye_cheat_time
+        self.eye_closure_threshold = eye_closure_threshold
+        # Seconds added on each side of an interval before merging
+        self.padding = padding
+
+    @staticmethod
+    def runs(mask):
+        """(starts, ends) indices of each run of True in `mask`, ends inclusive."""
+        edges = np.diff(np.concatenate(([0], np.asarray(mask, dtype=np.int8), [0])))
+        return np.flatnonzero(edges == 1), np.flatnonzero(edges == -1) - 1
+
+    def eye_directions(self, eye_height, eye_probs):
+        """
+        (n, 2) direction codes per sample. Samples without landmarks carry the
+        previous sample's directions over, starting from CENTER.
+        """
+        n = len(eye_height)
+        with np.errstate(invalid="ignore"):
+            closed = (eye_height < self.eye_closure_threshold) | np.isnan(eye_probs[:, :, 0])
+        directions = np.where(closed, CLOSED, np.argmax(np.nan_to_num(eye_probs, nan=-np.inf), axis=2))
+
+        # Forward fill from the last sample that had landmarks
+        has_landmarks = ~np.isnan(eye_height[:, 0])
+        source = np.maximum.accumulate(np.where(has_landmarks, np.arange(n), -1)) if n else np.zeros(0, dtype=int)
+        return np.where((source >= 0)[:, None], directions[np.maximum(source, 0)], CENTER)
+
+    def _long_runs(self, frames, mask):
+        # Runs whose first and last sampled frames are at least closed_eye_cheat_time apart
+        starts, ends = self.runs(mask)
+        first, last = frames[starts], frames[ends]
+        keep = (last - first) / self.fps >= self.closed_eye_cheat_time
+        return np.stack((first[keep], last[keep]), axis=1)
+
+    def frame_intervals(self, frames, head_tilt, eye_height, eye_probs):
+        """Returns (head_tilt, closed_eye, gaze) as (k, 2) arrays of first/last frame numbers."""
+        return self.direction_intervals(frames, head_tilt, self.eye_directions(eye_height, eye_probs))
+
+    def log_intervals(self, log):
+        """frame_intervals() straight from a DetectionLog's columns."""
+        records = log.view()
+        directions = np.stack((records["left_dir"], records["right_dir"]), axis=1)
+        return self.direction_intervals(records["frame"], records["head_tilt"], directions)
+
+    def direction_intervals(self, frames, head_tilt, directions):
+        """frame_intervals() from (n, 2) direction codes that already carry over missing landmarks."""
+        frames = np.asarray(frames, dtype=np.int64)
+
+        head = self._long_runs(frames, head_tilt)
+        gaze = self._long_runs(frames, ((directions == LEFT) | (directions == RIGHT)).any(axis=1))
+
+        # A closed-eye run counts once its video time span reaches the limit; a run
+        # cut off by the end of the video must also pass the frame-span check
+        starts, ends = self.runs((directions == CLOSED).all(axis=1))
+        first, last = frames[starts], frames[ends]
+        keep = last / self.fps - first / self.fps >= self.closed_eye_cheat_time
+        keep &= (ends < len(frames) - 1) | ((last - first) / self.fps >= self.closed_eye_cheat_time)
+        closed_eye = np.stack((first[keep], last[keep]), axis=1)
+
+        return head, closed_eye, gaze
+
+    def to_seconds(self, frame_intervals, video_duration):
+        """Pads the frame intervals, clips them to the video and merges the overlaps."""
+        if self.fps == 0:
+            return []
+        intervals = np.concatenate([np.reshape(iv, (-1, 2)) for iv in frame_intervals])
+        # Single-sample intervals are dropped, as in get_cheating_intervals()
+        intervals = intervals[intervals[:, 0] != intervals[:, 1]]
+        starts = np.maximum(0, intervals[:, 0] / self.fps - self.padding)
+        ends = np.minimum(video_duration, intervals[:, 1] / self.fps + self.padding)
+        return IntervalSet.from_arrays(starts, ends).to_list()
+
+    def cheating_intervals(self, frames, head_tilt, eye_height, eye_probs, video_duration):
+        return self.to_seconds(self.frame_intervals(frames, head_tilt, eye_height, eye_probs), video_duration)
@@ -0,0 +1,443 @@
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import signal
+import sqlite3
+import threading
+import time
+import uuid
+from collections import namedtuple
+from contextlib import contextmanager
+
+
+# queued -> running -> done | failed | cancelled; queued jobs can also go straight to cancelled
+JOB_STATES = ("queued", "running", "done", "failed", "cancelled")
+FINISHED_STATES = ("done", "failed", "cancelled")
+
+Job = namedtuple(
+    "Job",
+    ["id", "status", "params", "progress", "result", "error",
+     "created", "started", "finished", "worker", "cancel_requested"]
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    params TEXT NOT NULL,
+    progress TEXT NOT NULL DEFAULT '',
+    result TEXT,
+    error TEXT,
+    created REAL NOT NULL,
+    started REAL,
+    finished REAL,
+    worker TEXT,
+    cancel_requested INTEGER NOT NULL DEFAULT 0
+)
+"""
+
+
+class JobQueue:
+    """
+    SQLite-backed queue of ProcessCheating jobs, shared by whatever submits
+    them (the Streamlit app) and the worker processes that run them. Each job
+    gets its own directory under `root` for its uploaded inputs and everything
+    the run writes, so concurrent jobs never share final_videos/ or the
+    extracted_* folders. Every call opens its own connection, so any thread
+    or process can use the same queue.
+    """
+
+    def __init__(self, root: str = "jobs"):
+        self.root = os.path.abspath(root)
+        self.db_path = os.path.join(self.root, "jobs.db")
+        os.makedirs(self.root, exist_ok=True)
+        with self._db() as db:
+            # WAL lets the app poll while a worker writes progress
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(_SCHEMA)
+
+    @contextmanager
+    def _db(self):
+        db = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        db.row_factory = sqlite3.Row
+        try:
+            yield db
+        finally:
+            db.close()
+
+    @staticmethod
+    def _job(row):
+        if row is None:
+            return None
+        job = dict(row)
+        job["params"] = json.loads(job["params"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        job["cancel_requested"] = bool(job["cancel_requested"])
+        return Job(**job)
+
+    def job_dir(self, job_id: str) -> str:
+        return os.path.join(self.root, job_id)
+
+    # ---------------- SUBMITTING AND POLLING ----------------
+
+    def submit(self, params: dict, inputs=None) -> str:
+        """
+        Queues a job with ProcessCheating keyword arguments. `inputs` maps an
+        argument name to (file name, data); each file is written into the job's
+        directory and the argument set to its path. Returns the job ID.
+        """
+        job_id = uuid.uuid4().hex
+        params = dict(params)
+        input_dir = os.path.join(self.job_dir(job_id), "inputs")
+        os.makedirs(input_dir)
+        for name, (file_name, data) in (inputs or {}).items():
+            # Same file name for two inputs must not clash
+            path = os.path.join(input_dir, f"{name}_{os.path.basename(file_name)}")
+            with open(path, "wb") as f:
+                f.write(data)
+            params[name] = path
+
+        with self._db() as db:
+            db.execute(
+                "INSERT INTO jobs (id, status, params, created) VALUES (?, 'queued', ?, ?)",
+                (job_id, json.dumps(params), time.time())
+            )
+        return job_id
+
+    def get(self, job_id: str):
+        with self._db() as db:
+            return self._job(db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone())
+
+    def jobs(self, status=None, limit: int = 50):
+        """Newest first, optionally only those in one state."""
+        with self._db() as db:
+            if status is None:
+                rows = db.execute("SELECT * FROM jobs ORDER BY created DESC LIMIT ?", (limit,))
+            else:
+                rows = db.execute("SELECT * FROM jobs WHERE status = ? ORDER BY created DESC LIMIT ?", (status, limit))
+            return [self._job(row) for row in rows]
+
+    def cancel(self, job_id: str) -> bool:
+        """
+        Cancels a queued job at once; a running one is flagged, and the worker
+        pool stops it. Returns False when the job had already finished.
+        """
+        with self._db() as db:
+            cursor = db.execute(
+                "UPDATE jobs SET status = 'cancelled', finished = ? WHERE id = ? AND status = 'queued'",
+                (time.time(), job_id)
+            )
+            if cursor.rowcount:
+                return True
+            cursor = db.execute("UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND status = 'running'", (job_id,))
+            return cursor.rowcount > 0
+
+    # ---------------- WORKER SIDE ----------------
+
+    def claim(self, worker: str):
+        """Moves the oldest queued job to running for `worker` and returns it; None when idle."""
+        with self._db() as db:
+            # IMMEDIATE takes the write lock up front, so two workers never claim the same job
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                row = db.execute("SELECT id FROM jobs WHERE status = 'queued' ORDER BY created LIMIT 1").fetchone()
+                if row is not None:
+                    db.execute(
+                        "UPDATE jobs SET status = 'running', started = ?, worker = ? WHERE id = ?",
+                        (time.time(), worker, row["id"])
+                    )
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+        return None if row is None else self.get(row["id"])
+
+    def progress(self, job_id: str, message: str):
+        with self._db() as db:
+            db.execute("UPDATE jobs SET progress = ? WHERE id = ?", (message, job_id))
+
+    def _finish(self, job_id: str, status: str, result=None, error=None):
+        # Only a running job can finish, so a job cancelled meanwhile stays cancelled
+        with self._db() as db:
+            db.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, finished = ? WHERE id = ? AND status = 'running'",
+                (status, None if result is None else json.dumps(result), error, time.time(), job_id)
+            )
+
+    def finish(self, job_id: str, result):
+        self._finish(job_id, "done", result=result)
+
+    def fail(self, job_id: str, error: str):
+        self._finish(job_id, "failed", error=error)
+
+    def mark_cancelled(self, job_id: str):
+        self._finish(job_id, "cancelled")
+
+    def fail_queued(self, error: str) -> int:
+        """Fails every queued job at once, for when no worker can run them. Returns how many."""
+        with self._db() as db:
+            cursor = db.execute(
+                "UPDATE jobs SET status = 'failed', error = ?, finished = ? WHERE status = 'queued'",
+                (error, time.time())
+            )
+            return cursor.rowcount
+
+    # ---------------- RETENTION ----------------
+
+    def purge(self, older_than: float) -> int:
+        """
+        Deletes jobs that finished more than `older_than` seconds ago, with
+        their directories (inputs and outputs). Returns how many went.
+        """
+        with self._db() as db:
+            rows = db.execute(
+                "SELECT id FROM jobs WHERE status IN ('done', 'failed', 'cancelled') AND finished < ?",
+                (time.time() - older_than,)
+            ).fetchall()
+            for row in rows:
+                db.execute("DELETE FROM jobs WHERE id = ?", (row["id"],))
+        for row in rows:
+            shutil.rmtree(self.job_dir(row["id"]), ignore_errors=True)
+        return len(rows)
+
+
+# ---------------- WORKERS ----------------
+
+def run_job(queue: JobQueue, job: Job):
+    """Runs one claimed job inside its own directory and records the outcome."""
+    from ProcessCheating import ProcessCheating
+
+    def status(message):
+        # The interview ratings arrive as a list; they are part of the result instead
+        if not isinstance(message, list):
+            queue.progress(job.id, str(message))
+
+    work_dir = queue.job_dir(job.id)
+    cwd = os.getcwd()
+    os.chdir(work_dir)
+    try:
+        result = ProcessCheating(**job.params).run(status_callback=status)
+        result["outputs"] = {name: os.path.join(work_dir, path) for name, path in result["outputs"].items()}
+        queue.finish(job.id, result)
+    except Exception as e:
+        queue.fail(job.id, f"{type(e).__name__}: {e}")
+    finally:
+        os.chdir(cwd)
+
+
+def _warm_up(queue: JobQueue, worker: str, poll_interval: float, backend: str, attempts: int = 3,
+             max_backoff: float = 60.0):
+    """
+    Loads the models, retrying with exponential backoff. After `attempts`
+    failures in a row the queued jobs are failed with the error, since no
+    worker could run them; retries go on at the longest backoff after that.
+    """
+    from ModelRegistry import MODEL_REGISTRY
+
+    failures = 0
+    while True:
+        try:
+            return MODEL_REGISTRY.get_detector(backend=backend)
+        except Exception as e:
+            failures += 1
+            error = f"Model warm-up failed: {type(e).__name__}: {e}"
+            print(f"Worker {worker}: {error} (attempt {failures})")
+            if failures >= attempts:
+                failed = queue.fail_queued(error)
+                if failed:
+                    print(f"Worker {worker}: failed {failed} queued job(s)")
+            time.sleep(min(max_backoff, poll_interval * 2 ** failures))
+
+
+def _watch_parent(queue: JobQueue, worker: str, parent_pid: int, poll_interval: float, current: dict):
+    """
+    Ends the worker, its process group included, once the server that
+    spawned it is gone. Covers the warm-up and jobs in progress; an idle
+    worker notices in its own loop.
+    """
+    while os.getppid() == parent_pid:
+        time.sleep(poll_interval)
+    print(f"Worker {worker}: server {parent_pid} is gone, exiting")
+    job_id = current.get("job")
+    if job_id is not None:
+        queue.fail(job_id, "Job server stopped while the job was running")
+    if hasattr(os, "killpg"):
+        os.killpg(os.getpgrp(), signal.SIGKILL)
+    os._exit(1)
+
+
+def _worker_main(root: str, worker: str, poll_interval: float, backend: str, parent_pid: int):
+    from DetectionCache import DETECTION_CACHE
+    from ResultCache import RESULT_CACHE
+
+    # Own process group, so a cancellation can take ffmpeg and the other children down with the worker.
+    # The server's signals no longer reach the group, so the worker watches the server itself
+    if hasattr(os, "setpgrp"):
+        os.setpgrp()
+
+    queue = JobQueue(root)
+    current = {"job": None}
+    threading.Thread(
+        target=_watch_parent, args=(queue, worker, parent_pid, poll_interval, current),
+        name="parent-watch", daemon=True
+    ).start()
+
+    # Jobs run in their own directories, but the caches stay shared between them
+    DETECTION_CACHE.cache_dir = os.path.abspath(DETECTION_CACHE.cache_dir)
+    RESULT_CACHE.cache_dir = os.path.abspath(RESULT_CACHE.cache_dir)
+
+    # Loaded once per worker; every job after that reuses the warm models
+    _warm_up(queue, worker, poll_interval, backend)
+    print(f"Worker {worker} ready")
+
+    # A worker orphaned by a dead server stops claiming jobs
+    while os.getppid() == parent_pid:
+        job = queue.claim(worker)
+        if job is None:
+            time.sleep(poll_interval)
+            continue
+        print(f"Worker {worker} running job {job.id}")
+        current["job"] = job.id
+        run_job(queue, job)
+        current["job"] = None
+
+
+class JobService:
+    """
+    A pool of long-lived worker processes in front of a JobQueue. Each worker
+    loads the models once and then runs one job at a time. A supervisor
+    thread replaces workers that die, failing their job, and carries out
+    cancellations of running jobs by killing their worker's process group;
+    a fresh worker takes its place. Finished jobs are purged, directories
+    included, `retention` seconds after they finish (None keeps them).
+    """
+
+    def __init__(self, root: str = "jobs", workers: int = 2, poll_interval: float = 0.5, backend: str = "native",
+                 retention: float = 7 * 24 * 3600, cleanup_interval: float = 600.0):
+        self.queue = JobQueue(root)
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.backend = backend
+        self.retention = retention
+        self.cleanup_interval = cleanup_interval
+
+        # spawn, not fork: TensorFlow and torch do not survive fork()
+        self._ctx = multiprocessing.get_context("spawn")
+        self._processes = {}  # slot -> (worker name, process)
+        self._stopping = threading.Event()
+        self._supervisor = None
+        self._next_cleanup = 0.0
+
+    def start(self):
+        self._reap_orphans()
+        self._cleanup()
+        for slot in range(self.workers):
+            self._spawn(slot)
+        self._supervisor = threading.Thread(target=self._supervise, name="job-supervisor", daemon=True)
+        self._supervisor.start()
+        return self
+
+    def stop(self):
+        self._stopping.set()
+        if self._supervisor is not None:
+            self._supervisor.join()
+        for name, process in self._processes.values():
+            self._kill(process)
+        # Jobs cut off by the shutdown do not stay "running" forever
+        for job in self.queue.jobs(status="running", limit=-1):
+            if job.worker in {name for name, _ in self._processes.values()}:
+                self.queue.fail(job.id, "Worker pool stopped")
+
+    def _reap_orphans(self):
+        """Fails jobs left running by a server process that is gone, e.g. after a crash or restart."""
+        for job in self.queue.jobs(status="running", limit=-1):
+            # Worker names start with the server's PID
+            server_pid = int(job.worker.split("-", 1)[0])
+            if server_pid == os.getpid() or not _pid_alive(server_pid):
+                self.queue.fail(job.id, "Job server stopped while the job was running")
+
+    def _cleanup(self):
+        self._next_cleanup = time.monotonic() + self.cleanup_interval
+        if self.retention is not None:
+            purged = self.queue.purge(self.retention)
+            if purged:
+                print(f"Purged {purged} finished job(s)")
+
+    @staticmethod
+    def _kill(process, timeout: float = 5.0):
+        # The worker leads its own process group; before it has set that up, only the worker itself is there to kill
+        if hasattr(os, "killpg"):
+            try:
+                os.killpg(process.pid, signal.SIGTERM)
+            except ProcessLookupError:
+                process.terminate()
+        else:
+            process.terminate()
+        process.join(timeout)
+        if hasattr(os, "killpg"):
+            # Whatever ignored SIGTERM, the worker included
+            try:
+                os.killpg(process.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+        elif process.is_alive():
+            process.kill()
+        process.join()
+
+    def _spawn(self, slot):
+        name = f"{os.getpid()}-{slot}-{uuid.uuid4().hex[:6]}"
+        process = self._ctx.Process(
+            target=_worker_main, args=(self.queue.root, name, self.poll_interval, self.backend, os.getpid()),
+            name=f"job-worker-{slot}", daemon=True
+        )
+        process.start()
+        self._processes[slot] = (name, process)
+
+    def _supervise(self):
+        while not self._stopping.wait(self.poll_interval):
+            running = {job.worker: job for job in self.queue.jobs(status="running", limit=-1)}
+            for slot, (name, process) in list(self._processes.items()):
+                job = running.get(name)
+                if not process.is_alive():
+                    if job is not None:
+                        self.queue.fail(job.id, f"Worker exited with code {process.exitcode}")
+                    self._spawn(slot)
+                elif job is not None and job.cancel_requested:
+                    self._kill(process)
+                    self.queue.mark_cancelled(job.id)
+                    self._spawn(slot)
+            if time.monotonic() >= self._next_cleanup:
+                self._cleanup()
+
+
+def _pid_alive(pid):
+    # os.kill(pid, 0) would send CTRL_C_EVENT on Windows; there one server per root is assumed
+    if os.name == "nt":
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the ProcessCheating job workers.")
+    parser.add_argument("--root", default="jobs", help="Queue database and per-job directories")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--backend", default="native")
+    parser.add_argument("--retention-days", type=float, default=7.0, help="Days finished jobs are kept; 0 keeps them")
+    args = parser.parse_args()
+
+    retention = args.retention_days * 24 * 3600 if args.retention_days else None
+    service = JobService(args.root, args.workers, backend=args.backend, retention=retention).start()
+    print(f"{args.workers} worker(s) serving {service.queue.db_path}; Ctrl+C to stop")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        service.stop()
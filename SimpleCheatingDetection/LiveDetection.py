@@ -0,0 +1,276 @@
+import argparse
+import queue
+import threading
+import time
+from collections import deque, namedtuple
+
+import cv2
+
+
+# A cheating run that just qualified ("start", end=None) or just finished ("end").
+# start/end are seconds into the stream; frame is the frame number that raised it.
+CheatingEvent = namedtuple("CheatingEvent", ["kind", "type", "start", "end", "frame"])
+
+# Event type, DetectionSession run attribute and interval list attribute
+TRACKED_RUNS = (
+    ("head_tilt", "head_tilt_run", "cheating_frame_list_head_tilt"),
+    ("closed_eye", "closed_eye_run", "cheating_frame_list_eye_tilt"),
+    ("gaze", "gaze_run", "cheating_frame_list_gaze"),
+    ("extra_person", "extra_person_run", "cheating_frame_list_extra_person"),
+)
+
+LiveFrame = namedtuple("LiveFrame", ["frame", "frame_count", "pushed_at"])
+
+
+class FileCamera:
+    """
+    Replays a video file as if it were a camera: read() hands out frames at
+    their recorded pace (scaled by `speed`; None for as fast as possible) and
+    `timestamp` is the last frame's time in the file. Stands in for a device
+    or RTSP stream when testing LiveDetector.
+    """
+
+    def __init__(self, path: str, speed: float = 1.0):
+        self.cap = cv2.VideoCapture(path)
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS) or 30.0
+        self.speed = speed
+        self.frame_count = 0
+        self.timestamp = 0.0
+        self._started = None
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def read(self):
+        ret, frame = self.cap.read()
+        if not ret:
+            return ret, frame
+        self.frame_count += 1
+        self.timestamp = self.frame_count / self.fps
+
+        if self.speed:
+            if self._started is None:
+                self._started = time.monotonic() - self.timestamp / self.speed
+            delay = self._started + self.timestamp / self.speed - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+        return ret, frame
+
+    def release(self):
+        self.cap.release()
+
+
+class LiveDetector:
+    """
+    Incremental detection over a live stream. push() takes frames with their
+    timestamps as they arrive; a worker thread runs the models on the newest
+    sampled frames and raises CheatingEvents as soon as a run qualifies and
+    again when it ends. Under backpressure the oldest waiting frames are
+    dropped, and frames older than max_latency are skipped, so the delay
+    between a frame arriving and its analysis stays bounded.
+
+    Events are queued for poll_events(); on_event, if given, is also called
+    with each one, on the worker thread.
+    """
+
+    def __init__(self, detector, fps: float = 30.0, max_queue: int = 4, max_latency: float = 1.0, on_event=None):
+        self.detector = detector
+        # Nominal rate that turns timestamps into frame numbers for the session
+        self.fps = fps
+        self.max_queue = max_queue
+        self.max_latency = max_latency
+        self.on_event = on_event
+
+        self.session = None
+        self.events = queue.Queue()
+        self.stats = {"received": 0, "sampled": 0, "analyzed": 0, "dropped": 0, "max_latency": 0.0}
+
+        self._waiting = deque()
+        self._cond = threading.Condition()
+        self._stopping = False
+        self._worker = None
+        self._errors = []
+        self._last_frame = 0
+        self._last_sampled = 0
+        self._active = {}
+        self._seen = {}
+
+    def start(self):
+        self.session = self.detector.new_session(self.fps)
+        self._active = {name: False for name, _, _ in TRACKED_RUNS}
+        self._seen = {name: 0 for name, _, _ in TRACKED_RUNS}
+        self._stopping = False
+        self._worker = threading.Thread(target=self._work, name="live-detector", daemon=True)
+        self._worker.start()
+        return self
+
+    def push(self, frame, timestamp: float) -> bool:
+        """Offers one frame taken `timestamp` seconds into the stream. Returns whether it was queued."""
+        with self._cond:
+            self.stats["received"] += 1
+            frame_count = max(self._last_frame + 1, round(timestamp * self.fps))
+            self._last_frame = frame_count
+
+            # Same stride as the file modes, counted in frames of the nominal rate
+            if frame_count - self._last_sampled < self.detector.skip_frames:
+                return False
+            self._last_sampled = frame_count
+            self.stats["sampled"] += 1
+
+            if len(self._waiting) >= self.max_queue:
+                self._waiting.popleft()
+                self.stats["dropped"] += 1
+            self._waiting.append(LiveFrame(frame, frame_count, time.monotonic()))
+            self._cond.notify()
+        return True
+
+    def poll_events(self):
+        """Every event raised since the last call, oldest first."""
+        events = []
+        while True:
+            try:
+                events.append(self.events.get_nowait())
+            except queue.Empty:
+                return events
+
+    def stop(self):
+        """
+        Analyzes what is still queued, closes open runs and returns the
+        DetectionSession. Does nothing and returns None when the detector is
+        not running, so cleanup paths can call it unconditionally.
+        """
+        if self._worker is None:
+            return None
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        self._worker.join()
+        self._worker = None
+        self.session.close()
+        if self._errors:
+            raise self._errors[0]
+
+        session = self.session
+        session.video_duration = self._last_frame / self.fps
+        session.flush_intervals()
+        self._check_events(self._last_frame, final=True)
+        return session
+
+    def run(self, capture):
+        """
+        Reads `capture` (a cv2.VideoCapture, FileCamera or anything with read())
+        until it ends, pushing every frame. Returns the DetectionSession.
+        """
+        self.start()
+        started = time.monotonic()
+        try:
+            while not self._errors:
+                ret, frame = capture.read()
+                if not ret:
+                    break
+                # Files know their own timeline; live sources use the arrival time
+                timestamp = getattr(capture, "timestamp", None)
+                self.push(frame, time.monotonic() - started if timestamp is None else timestamp)
+        finally:
+            capture.release()
+        return self.stop()
+
+    # ---------------- WORKER ----------------
+
+    def _work(self):
+        batch_size = self.detector.yolo_batch_size
+        try:
+            while True:
+                with self._cond:
+                    while not self._waiting and not self._stopping:
+                        self._cond.wait()
+                    if not self._waiting:
+                        return
+                    # Whatever is waiting goes through the models together, up to one micro-batch
+                    items = [self._waiting.popleft() for _ in range(min(batch_size, len(self._waiting)))]
+                    # push() counts drops too, so stale frames are counted under the same lock
+                    now = time.monotonic()
+                    fresh = [item for item in items if now - item.pushed_at <= self.max_latency]
+                    self.stats["dropped"] += len(items) - len(fresh)
+
+                if fresh:
+                    self._analyze(fresh)
+        except Exception as e:
+            self._errors.append(e)
+
+    def _analyze(self, items):
+        session = self.session
+        detections = self.detector.detect_frames(session, [(item.frame, item.frame_count) for item in items])
+        done = time.monotonic()
+        for item, det in zip(items, detections):
+            session.video_duration = item.frame_count / self.fps
+            session.apply_detection(det)
+            self._check_events(item.frame_count)
+            self.stats["analyzed"] += 1
+            self.stats["max_latency"] = max(self.stats["max_latency"], done - item.pushed_at)
+
+    def _check_events(self, frame_count, final=False):
+        session = self.session
+        fps = self.fps
+        for name, run_attr, list_attr in TRACKED_RUNS:
+            # Runs that finished since the last check
+            intervals = getattr(session, list_attr)
+            while self._seen[name] < len(intervals):
+                first, last = intervals[self._seen[name]]
+                self._seen[name] += 1
+                if not self._active[name]:
+                    self._emit(CheatingEvent("start", name, first / fps, None, frame_count))
+                self._emit(CheatingEvent("end", name, first / fps, last / fps, frame_count))
+                self._active[name] = False
+
+            run = getattr(session, run_attr)
+            if final:
+                # Runs still open when the stream stops end with it
+                if self._active[name] and run:
+                    self._emit(CheatingEvent("end", name, run[0] / fps, run[1] / fps, frame_count))
+                    self._active[name] = False
+            elif run and not self._active[name] and self._qualifies(name, run):
+                self._active[name] = True
+                self._emit(CheatingEvent("start", name, run[0] / fps, None, frame_count))
+            elif not run:
+                self._active[name] = False
+
+    def _qualifies(self, name, run):
+        if name == "closed_eye":
+            return self.session.cheating_detected_eye_tilt
+        first, last = run
+        return (last - first) / self.fps >= self.session.closed_eye_cheat_time
+
+    def _emit(self, event):
+        self.events.put(event)
+        if self.on_event is not None:
+            self.on_event(event)
+
+
+def open_source(source):
+    """A cv2.VideoCapture for a device index ("0"), a stream URL or a file."""
+    return cv2.VideoCapture(int(source) if str(source).isdigit() else source)
+
+
+if __name__ == "__main__":
+    from SimpleCheatingDetector import SimpleCheatingDetector
+
+    parser = argparse.ArgumentParser(description="Raise cheating events from a live camera, stream or replayed file.")
+    parser.add_argument("--source", help="Camera index or stream URL")
+    parser.add_argument("--replay", help="Video file replayed at its own pace in place of a camera")
+    parser.add_argument("--speed", type=float, default=1.0, help="Replay speed; 0 for as fast as possible")
+    parser.add_argument("--fps", type=float, default=30.0)
+    parser.add_argument("--max-latency", type=float, default=1.0)
+    args = parser.parse_args()
+
+    if args.replay:
+        capture = FileCamera(args.replay, speed=args.speed or None)
+        fps = capture.fps
+    else:
+        capture = open_source(args.source or "0")
+        fps = args.fps
+
+    live = LiveDetector(SimpleCheatingDetector(), fps=fps, max_latency=args.max_latency, on_event=print)
+    session = live.run(capture)
+    print("Stats:", live.stats)
+    print("Cheating intervals (in seconds):", session.get_cheating_intervals())
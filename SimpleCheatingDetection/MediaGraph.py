@@ -0,0 +1,271 @@
+import argparse
+import os
+import re
+import subprocess
+import time
+import uuid
+from collections import namedtuple
+
+
+# Container facts parsed from `ffmpeg -i`, the same source moviepy reads durations from
+MediaInfo = namedtuple(
+    "MediaInfo",
+    ["duration", "width", "height", "fps", "has_audio", "video_codec", "sample_rate", "channels"]
+)
+
+EPS = 0.001  # Same end-of-file margin as Video.edit_video
+
+
+def ffmpeg_exe():
+    # moviepy already depends on imageio-ffmpeg, which honors IMAGEIO_FFMPEG_EXE
+    try:
+        import imageio_ffmpeg
+        return imageio_ffmpeg.get_ffmpeg_exe()
+    except ImportError:
+        return "ffmpeg"
+
+
+def probe(path: str) -> MediaInfo:
+    proc = subprocess.run([ffmpeg_exe(), "-hide_banner", "-i", path], capture_output=True, text=True)
+    info = proc.stderr
+
+    match = re.search(r"Duration: (\d+):(\d+):(\d+\.\d+)", info)
+    if not match:
+        raise RuntimeError(f"Could not read duration of {path}")
+    h, m, s = match.groups()
+    duration = int(h) * 3600 + int(m) * 60 + float(s)
+
+    width = height = fps = codec = None
+    video = re.search(r"Stream #.*Video: (\w+).*", info)
+    if video:
+        codec = video.group(1)
+        size = re.search(r"\b(\d{2,5})x(\d{2,5})\b", video.group(0))
+        rate = re.search(r"([\d.]+) (?:fps|tbr)", video.group(0))
+        if size:
+            width, height = int(size.group(1)), int(size.group(2))
+        if rate:
+            fps = float(rate.group(1))
+
+    sample_rate = channels = None
+    audio = re.search(r"Stream #.*Audio: .*", info)
+    if audio:
+        rate = re.search(r"(\d+) Hz, (\w+)", audio.group(0))
+        if rate:
+            sample_rate = int(rate.group(1))
+            # Surround layouts are treated as stereo; nothing downstream needs more
+            channels = 1 if rate.group(2) == "mono" else 2
+
+    return MediaInfo(duration, width, height, fps, audio is not None, codec, sample_rate, channels)
+
+
+def clamp_cuts(cuts, duration):
+    # Mirrors Video.edit_video: clip to the file and drop empty intervals
+    segments = []
+    for start, end in cuts:
+        start = max(0, start)
+        end = min(duration - EPS, end)
+        if end > start:
+            segments.append((start, end))
+    return segments
+
+
+def select_expr(segments):
+    return "+".join(f"between(t,{start:.6f},{end:.6f})" for start, end in segments)
+
+
+class MediaGraph:
+    """
+    Plans the post-detection media steps of ProcessCheating.run (audio mux,
+    cutting both POVs and the side-by-side merge) as a single ffmpeg command.
+    Every input is decoded once and every output encoded once, instead of
+    each step decoding and re-encoding the previous step's file.
+    """
+
+    def __init__(self, crf=23, preset="medium"):
+        # libx264 defaults, same as moviepy's write_videofile
+        self.crf = crf
+        self.preset = preset
+
+    def _video_codec(self, fps):
+        # select leaves the output rate unset, so pin it to the input rate
+        return ["-c:v", "libx264", "-preset", self.preset, "-crf", str(self.crf), "-pix_fmt", "yuv420p", "-r", str(fps)]
+
+    def plan_interview(self, annotated_video_path: str, audio_path: str, second_pov_path: str, cuts,
+                       student_output_path: str, second_pov_output_path: str, final_output_path: str,
+                       annotated_segments=None):
+        """
+        Returns (ffmpeg command, {name: output path}), or (None, {}) when no
+        interval survives trimming. When the annotated video only holds the
+        clips already (SimpleCheatingDetector.render_intervals), annotated_segments
+        are the segments it was cut to; the video is then used whole and only the
+        audio is cut. Outputs match the old chain:
+
+        - student: annotated video + combined audio, cut to `cuts`
+        - second_pov: second POV without audio, cut to `cuts`
+        - final: both side by side (clips_array layout) with the combined audio
+
+        The second POV and final outputs are skipped, as before, when no
+        interval falls inside the second POV.
+        """
+        if annotated_segments is not None and not annotated_segments:
+            return None, {}
+        student = probe(annotated_video_path)
+        pov = probe(second_pov_path)
+        fps = student.fps
+
+        if annotated_segments is None:
+            student_segments = clamp_cuts(cuts, student.duration)
+            video_select = f"select='{select_expr(student_segments)}',"
+        else:
+            student_segments = annotated_segments
+            video_select = ""
+        pov_segments = clamp_cuts(cuts, pov.duration)
+        if not student_segments:
+            return None, {}
+
+        # ---------------- STUDENT POV ----------------
+        # Inputs: 0 = annotated video, 1 = combined audio, 2 = second POV
+        filters = [
+            f"[0:v]fps={fps},{video_select}setpts=N/{fps}/TB[sv]",
+            f"[1:a]aselect='{select_expr(student_segments)}',asetpts=N/SR/TB[sa]",
+        ]
+        outputs = {"student": student_output_path}
+
+        if pov_segments:
+            outputs["second_pov"] = second_pov_output_path
+            outputs["final"] = final_output_path
+
+            # ---------------- SECOND POV ----------------
+            # Resampled to the student frame rate, as clips_array writes at one fps
+            filters.append(f"[2:v]fps={fps},select='{select_expr(pov_segments)}',setpts=N/{fps}/TB[pv]")
+
+            # ---------------- SIDE BY SIDE ----------------
+            # clips_array centers each clip in a cell as tall as the tallest one,
+            # and shows black once the shorter clip has ended
+            height = max(student.height, pov.height)
+            height += height % 2
+            student_len = sum(end - start for start, end in student_segments)
+            pov_len = sum(end - start for start, end in pov_segments)
+
+            def cell(label, length):
+                tail = max(student_len, pov_len) - length
+                pad = f"pad=ceil(iw/2)*2:{height}:0:({height}-ih)/2:black"
+                if tail > 1.0 / fps:
+                    pad += f",tpad=stop_mode=add:stop_duration={tail:.6f}:color=black"
+                return f"[{label}]{pad}[{label}c]"
+
+            filters += [
+                "[sv]split=2[svo][svs]",
+                "[pv]split=2[pvo][pvs]",
+                "[sa]asplit=2[sao][sas]",
+                cell("svs", student_len),
+                cell("pvs", pov_len),
+                "[svsc][pvsc]hstack=inputs=2[stack]",
+            ]
+            student_video, student_audio = "[svo]", "[sao]"
+        else:
+            student_video, student_audio = "[sv]", "[sa]"
+
+        cmd = [
+            ffmpeg_exe(), "-hide_banner", "-loglevel", "error", "-y",
+            "-i", annotated_video_path,
+            "-i", audio_path,
+            "-i", second_pov_path,
+            "-filter_complex", ";".join(filters),
+            "-map", student_video, "-map", student_audio, *self._video_codec(fps), "-c:a", "aac",
+            student_output_path,
+        ]
+        if pov_segments:
+            cmd += [
+                "-map", "[pvo]", *self._video_codec(fps), "-an", second_pov_output_path,
+                "-map", "[stack]", "-map", "[sas]", *self._video_codec(fps), "-c:a", "aac", final_output_path,
+            ]
+        return cmd, outputs
+
+    def render_interview(self, annotated_video_path: str, audio_path: str, second_pov_path: str, cuts,
+                         student_output_path: str = "final_videos/detected_student_final_video.mp4",
+                         second_pov_output_path: str = "final_videos/detected_student_final_video_second_pov.mp4",
+                         final_output_path: str = None, annotated_segments=None):
+        """Runs plan_interview's command; returns the {name: path} outputs written."""
+        if not cuts:
+            print("No cheating intervals detected — nothing to export.")
+            return {}
+
+        if final_output_path is None:
+            final_output_path = f"final_videos/{uuid.uuid4()}_final_video.mp4"
+
+        cmd, outputs = self.plan_interview(
+            annotated_video_path, audio_path, second_pov_path, cuts,
+            student_output_path, second_pov_output_path, final_output_path, annotated_segments
+        )
+        if cmd is None:
+            print("All detected clips were invalid after trimming.")
+            return outputs
+
+        for path in outputs.values():
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+        start = time.perf_counter()
+        proc = subprocess.run(cmd, capture_output=True, text=True)
+        if proc.returncode != 0:
+            raise RuntimeError(f"ffmpeg failed: {proc.stderr.strip()}")
+        print(f"Rendered {len(outputs)} output(s) in {time.perf_counter() - start:.2f}s")
+
+        return outputs
+
+
+# ---------------- BENCHMARK ----------------
+
+def _parse_cuts(text):
+    return [tuple(float(v) for v in cut.split("-")) for cut in text.split(",")]
+
+
+def benchmark(video_path, audio_path, second_pov_path, cuts, out_dir="benchmark_videos"):
+    """
+    Runs the old moviepy chain (three mutes, audio overlay, two edits and
+    clips_array) and the single ffmpeg graph on the same inputs, and reports
+    wall time and output durations for both.
+    """
+    from EditVideo import Video
+
+    report = {}
+
+    start = time.perf_counter()
+    for path in (video_path, video_path, second_pov_path):
+        Video().mute_audio(path)
+    combined = Video().overlay_video_audio(video_path, audio_path)
+    old_student = Video().edit_video(combined, os.path.join(out_dir, "old_student.mp4"), cuts)
+    old_pov = Video().edit_video(second_pov_path, os.path.join(out_dir, "old_second_pov.mp4"), cuts)
+    old_final = Video().clip_array(old_student, old_pov) if old_student and old_pov else None
+    report["old_seconds"] = time.perf_counter() - start
+    old_outputs = {"student": old_student, "second_pov": old_pov, "final": old_final}
+
+    start = time.perf_counter()
+    new_outputs = MediaGraph().render_interview(
+        video_path, audio_path, second_pov_path, cuts,
+        os.path.join(out_dir, "new_student.mp4"),
+        os.path.join(out_dir, "new_second_pov.mp4"),
+        os.path.join(out_dir, "new_final.mp4")
+    )
+    report["new_seconds"] = time.perf_counter() - start
+
+    for name in ("student", "second_pov", "final"):
+        old, new = old_outputs.get(name), new_outputs.get(name)
+        report[f"{name}_duration"] = (
+            probe(old).duration if old else None,
+            probe(new).duration if new else None
+        )
+    report["speedup"] = report["old_seconds"] / report["new_seconds"]
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the single-pass media graph against the moviepy chain.")
+    parser.add_argument("--video", required=True, help="Student video (e.g. the annotated detector output)")
+    parser.add_argument("--audio", required=True, help="Combined interview audio")
+    parser.add_argument("--second-pov", required=True)
+    parser.add_argument("--cuts", default="10-20,30-40", help="Comma-separated start-end intervals in seconds")
+    args = parser.parse_args()
+
+    for key, value in benchmark(args.video, args.audio, args.second_pov, _parse_cuts(args.cuts)).items():
+        print(f"{key}: {value}")
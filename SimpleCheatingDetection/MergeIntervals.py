@@ -1,3 +1,141 @@
+import numpy as np
+
+
+class IntervalSet:
+    """
+    A set of closed [start, end] intervals kept as two sorted NumPy arrays of
+    disjoint intervals. Overlapping or touching intervals are merged on the
+    way in. Set operations return a new IntervalSet and are vectorized sorts
+    and sweeps, O(n log n) at worst; add() inserts in place for streaming use.
+    Results of intersection, difference and complement only keep intervals of
+    positive length.
+    """
+
+    def __init__(self, intervals=()):
+        intervals = np.asarray(intervals)
+        if intervals.size == 0:
+            intervals = np.zeros((0, 2))
+        elif intervals.dtype.kind not in "iuf":
+            intervals = intervals.astype(np.float64)
+        self.starts, self.ends = self._normalize(intervals[:, 0], intervals[:, 1])
+
+    @classmethod
+    def from_arrays(cls, starts, ends):
+        interval_set = cls()
+        interval_set.starts, interval_set.ends = cls._normalize(np.asarray(starts), np.asarray(ends))
+        return interval_set
+
+    @classmethod
+    def _sorted(cls, starts, ends):
+        # Already sorted and disjoint, e.g. the output of a sweep
+        interval_set = cls()
+        interval_set.starts, interval_set.ends = starts, ends
+        return interval_set
+
+    @staticmethod
+    def _normalize(starts, ends):
+        if len(starts) == 0:
+            return starts, ends
+        order = np.lexsort((ends, starts))
+        starts, ends = starts[order], ends[order]
+        # A new interval begins wherever the start is past every end before it
+        reach = np.maximum.accumulate(ends)
+        first = np.concatenate(([True], starts[1:] > reach[:-1]))
+        last = np.concatenate((first[1:], [True]))
+        return starts[first], reach[last]
+
+    # ---------------- ACCESS ----------------
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __iter__(self):
+        return iter(zip(self.starts.tolist(), self.ends.tolist()))
+
+    def __repr__(self):
+        return f"IntervalSet({self.to_list()})"
+
+    def to_list(self):
+        return list(self)
+
+    def total(self):
+        """Summed length of the intervals."""
+        return float(np.sum(self.ends - self.starts))
+
+    # ---------------- SET OPERATIONS ----------------
+
+    def union(self, other):
+        return IntervalSet.from_arrays(np.concatenate((self.starts, other.starts)),
+                                       np.concatenate((self.ends, other.ends)))
+
+    def intersection(self, other):
+        # Sweep over every endpoint; both sets are disjoint, so depth 2 means inside both
+        points = np.concatenate((self.starts, other.starts, self.ends, other.ends))
+        deltas = np.repeat([1, -1], [len(self) + len(other)] * 2)
+        # Starts before ends at equal points, so touching intervals meet at depth 2
+        order = np.lexsort((-deltas, points))
+        points, deltas = points[order], deltas[order]
+        depth = np.cumsum(deltas)
+        starts = points[(deltas == 1) & (depth == 2)]
+        ends = points[(deltas == -1) & (depth == 1)]
+        keep = ends > starts
+        return IntervalSet._sorted(starts[keep], ends[keep])
+
+    def complement(self, duration, start=0.0):
+        """The gaps between the intervals within [start, duration], e.g. the clean segments of a video."""
+        clamped = self.clamp(start, duration)
+        starts = np.concatenate(([start], clamped.ends))
+        ends = np.concatenate((clamped.starts, [duration]))
+        keep = ends > starts
+        return IntervalSet._sorted(starts[keep], ends[keep])
+
+    def difference(self, other):
+        if len(self) == 0:
+            return IntervalSet._sorted(self.starts, self.ends)
+        return self.intersection(other.complement(self.ends[-1], self.starts[0]))
+
+    __or__ = union
+    __and__ = intersection
+    __sub__ = difference
+
+    # ---------------- TRANSFORMS ----------------
+
+    def pad(self, before, after=None):
+        """Widens every interval by `before` (and `after`, default the same), merging any that now overlap."""
+        after = before if after is None else after
+        return IntervalSet.from_arrays(self.starts - before, self.ends + after)
+
+    def clamp(self, lo, hi):
+        """Clips the intervals to [lo, hi], dropping those entirely outside it."""
+        starts = np.maximum(self.starts, lo)
+        ends = np.minimum(self.ends, hi)
+        keep = ends >= starts
+        return IntervalSet._sorted(starts[keep], ends[keep])
+
+    def bridge(self, max_gap):
+        """Joins neighbouring intervals separated by at most `max_gap`."""
+        if len(self) == 0:
+            return IntervalSet._sorted(self.starts, self.ends)
+        split = self.starts[1:] - self.ends[:-1] > max_gap
+        first = np.concatenate(([True], split))
+        last = np.concatenate((split, [True]))
+        return IntervalSet._sorted(self.starts[first], self.ends[last])
+
+    # ---------------- STREAMING ----------------
+
+    def add(self, start, end):
+        """Inserts one interval in place, merging it with any it overlaps or touches."""
+        # Intervals i..j-1 reach start and begin no later than end
+        i = np.searchsorted(self.ends, start, side="left")
+        j = np.searchsorted(self.starts, end, side="right")
+        if i < j:
+            start = min(start, self.starts[i])
+            end = max(end, self.ends[j - 1])
+        self.starts = np.concatenate((self.starts[:i], [start], self.starts[j:]))
+        self.ends = np.concatenate((self.ends[:i], [end], self.ends[j:]))
+        return self
+
+
 class MergeIntervals:
     def comp(self, a, b):
         if a[0] <= b[0]:
@@ -8,26 +146,16 @@ class MergeIntervals:
         if not intervals:
             return []
 
-        # Convert tuples → lists
-        intervals = [list(interval) for interval in intervals]
-
-        intervals.sort()
-
-        ans = [intervals[0]]
-
-        for i in range(1, len(intervals)):
-            if intervals[i][0] > ans[-1][1]:
-                ans.append(intervals[i])
-            else:
-                ans[-1][1] = max(ans[-1][1], intervals[i][1])
-                
-        ans = [tuple(interval) for interval in ans]
-
-        return ans
+        return IntervalSet(intervals).to_list()
 
 
 if __name__ == "__main__":
     merger = MergeIntervals()
     intervals = [[1,3],[2,6],[8,10],[15,18]]
     merged_intervals = merger.merge(intervals)
-    print("Merged Intervals:", merged_intervals)  # Output: [[1,6],[8,10],[15,18]]
\ No newline at end of file
+    print("Merged Intervals:", merged_intervals)  # Output: [(1, 6), (8, 10), (15, 18)]
+
+    gaze = IntervalSet([(5, 20), (40, 55)])
+    head_tilt = IntervalSet([(10, 45)])
+    print("Gaze and head tilt:", (gaze & head_tilt).to_list())  # [(10, 20), (40, 45)]
+    print("Clean segments:", (gaze | head_tilt).complement(60).to_list())  # [(0.0, 5.0), (55.0, 60.0)]
@@ -0,0 +1,416 @@
+import argparse
+import json
+import os
+import threading
+from collections import namedtuple
+
+import cv2
+import numpy as np
+
+
+BACKENDS = ("native", "onnx", "tflite")
+EXPORT_EXTENSIONS = {"onnx": ".onnx", "tflite": ".tflite"}
+
+# One YOLO detection in original frame pixels, highest confidence first
+Box = namedtuple("Box", ["class_name", "xyxy", "conf"])
+
+
+def exported_path(model_path: str, backend: str) -> str:
+    """models/modelv8-2.pt -> models/modelv8-2.onnx (or .tflite)."""
+    return os.path.splitext(model_path)[0] + EXPORT_EXTENSIONS[backend]
+
+
+def _metadata_path(model_path: str) -> str:
+    # Class names and input size of an exported YOLO model
+    return os.path.splitext(model_path)[0] + ".json"
+
+
+def _load_tflite_interpreter(model_path: str):
+    # Prefer the standalone runtimes so TFLite inference does not pull in TensorFlow
+    try:
+        from ai_edge_litert.interpreter import Interpreter
+    except ImportError:
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            from tensorflow.lite import Interpreter
+    return Interpreter(model_path=model_path)
+
+
+# ---------------- YOLO ----------------
+
+def letterbox(frame, imgsz):
+    """Ultralytics-style letterbox: resize keeping aspect ratio, pad to imgsz with gray 114."""
+    h, w = frame.shape[:2]
+    new_h, new_w = imgsz
+    r = min(new_h / h, new_w / w)
+    unpad_w, unpad_h = int(round(w * r)), int(round(h * r))
+    dw, dh = (new_w - unpad_w) / 2, (new_h - unpad_h) / 2
+
+    if (unpad_w, unpad_h) != (w, h):
+        frame = cv2.resize(frame, (unpad_w, unpad_h), interpolation=cv2.INTER_LINEAR)
+    top, bottom = int(round(dh - 0.1)), int(round(dh + 0.1))
+    left, right = int(round(dw - 0.1)), int(round(dw + 0.1))
+    frame = cv2.copyMakeBorder(frame, top, bottom, left, right, cv2.BORDER_CONSTANT, value=(114, 114, 114))
+    return frame, r, (left, top)
+
+
+def non_max_suppression(prediction, conf_thres=0.25, iou_thres=0.7, max_det=300):
+    """
+    Decodes one raw YOLOv8 head output of shape (4 + num_classes, anchors)
+    into (xyxy, conf, cls) arrays, with per-class NMS like Ultralytics.
+    """
+    scores_all = prediction[4:]
+    cls = scores_all.argmax(axis=0)
+    conf = scores_all[cls, np.arange(scores_all.shape[1])]
+    keep = conf > conf_thres
+    if not keep.any():
+        return np.zeros((0, 4), np.float32), np.zeros(0, np.float32), np.zeros(0, np.int64)
+
+    xywh = prediction[:4, keep].T
+    conf, cls = conf[keep], cls[keep]
+    xyxy = np.empty_like(xywh)
+    xyxy[:, :2] = xywh[:, :2] - xywh[:, 2:] / 2
+    xyxy[:, 2:] = xywh[:, :2] + xywh[:, 2:] / 2
+
+    # Offset boxes by class so one pass of NMS never suppresses across classes
+    offset = xyxy + (cls * 7680)[:, None]
+    areas = (offset[:, 2] - offset[:, 0]) * (offset[:, 3] - offset[:, 1])
+    order = conf.argsort()[::-1]
+    selected = []
+    while order.size and len(selected) < max_det:
+        i = order[0]
+        selected.append(i)
+        rest = order[1:]
+        xx1 = np.maximum(offset[i, 0], offset[rest, 0])
+        yy1 = np.maximum(offset[i, 1], offset[rest, 1])
+        xx2 = np.minimum(offset[i, 2], offset[rest, 2])
+        yy2 = np.minimum(offset[i, 3], offset[rest, 3])
+        inter = np.clip(xx2 - xx1, 0, None) * np.clip(yy2 - yy1, 0, None)
+        iou = inter / (areas[i] + areas[rest] - inter + 1e-9)
+        order = rest[iou <= iou_thres]
+
+    selected = np.array(selected, dtype=np.int64)
+    return xyxy[selected], conf[selected], cls[selected]
+
+
+class UltralyticsYolo:
+    """The original .pt model through Ultralytics/torch."""
+
+    def __init__(self, model_path: str):
+        import torch
+        from ultralytics import YOLO
+
+        # Check for GPU availability for YOLO
+        self.device = 0 if torch.cuda.is_available() else 'cpu'
+        print(f"YOLO using device: {self.device}")
+
+        self.model = YOLO(model_path)
+        self.names = self.model.names
+        # Ultralytics predictors keep per-call state, so concurrent sessions take turns
+        self._lock = threading.Lock()
+
+    def detect(self, frames):
+        with self._lock:
+            results = self.model(frames, verbose=False, device=self.device)
+        detections = []
+        for result in results:
+            detections.append([
+                Box(self.names[int(box.cls[0])], tuple(float(v) for v in box.xyxy[0]), float(box.conf[0]))
+                for box in result.boxes
+            ])
+        return detections
+
+
+class _ExportedYolo:
+    """Shared pre/post-processing for exported YOLO models; subclasses provide _forward."""
+
+    def __init__(self, model_path: str):
+        with open(_metadata_path(model_path)) as f:
+            metadata = json.load(f)
+        self.names = {int(k): v for k, v in metadata["names"].items()}
+        self.imgsz = tuple(metadata.get("imgsz", (640, 640)))
+
+    def detect(self, frames):
+        blobs = []
+        transforms = []
+        for frame in frames:
+            padded, r, pad = letterbox(frame, self.imgsz)
+            blobs.append(cv2.cvtColor(padded, cv2.COLOR_BGR2RGB).astype(np.float32) / 255.0)
+            transforms.append((frame.shape[:2], r, pad))
+
+        detections = []
+        for prediction, ((h, w), r, (pad_x, pad_y)) in zip(self._forward(np.stack(blobs)), transforms):
+            xyxy, conf, cls = non_max_suppression(prediction)
+
+            xyxy[:, [0, 2]] = ((xyxy[:, [0, 2]] - pad_x) / r).clip(0, w)
+            xyxy[:, [1, 3]] = ((xyxy[:, [1, 3]] - pad_y) / r).clip(0, h)
+            detections.append([
+                Box(self.names[int(c)], tuple(float(v) for v in box), float(p))
+                for box, p, c in zip(xyxy, conf, cls)
+            ])
+        return detections
+
+
+class OnnxYolo(_ExportedYolo):
+    def __init__(self, model_path: str):
+        import onnxruntime as ort
+
+        super().__init__(model_path)
+        self.session = ort.InferenceSession(model_path, providers=ort.get_available_providers())
+        self.input_name = self.session.get_inputs()[0].name
+        print(f"YOLO using ONNX Runtime: {self.session.get_providers()[0]}")
+
+    def _forward(self, blobs):
+        # NHWC -> NCHW; exported with a dynamic batch axis, so one run per micro-batch
+        return self.session.run(None, {self.input_name: blobs.transpose(0, 3, 1, 2)})[0]
+
+
+class TFLiteYolo(_ExportedYolo):
+    def __init__(self, model_path: str):
+        super().__init__(model_path)
+        self.interpreter = _load_tflite_interpreter(model_path)
+        self.interpreter.allocate_tensors()
+        self.input_index = self.interpreter.get_input_details()[0]["index"]
+        self.output_index = self.interpreter.get_output_details()[0]["index"]
+        # TFLite interpreters are not thread-safe
+        self._lock = threading.Lock()
+        print("YOLO using TFLite")
+
+    def _forward(self, blobs):
+        predictions = []
+        for blob in blobs:
+            with self._lock:
+                self.interpreter.set_tensor(self.input_index, blob[None])
+                self.interpreter.invoke()
+                prediction = self.interpreter.get_tensor(self.output_index)[0].copy()
+            # Ultralytics TFLite exports emit boxes normalized to the input size
+            prediction[[0, 2]] *= self.imgsz[1]
+            prediction[[1, 3]] *= self.imgsz[0]
+            predictions.append(prediction)
+        return predictions
+
+
+# ---------------- EYE MODEL ----------------
+
+class KerasEye:
+    """The original .h5 model through TensorFlow/Keras."""
+
+    def __init__(self, model_path: str):
+        import tensorflow as tf
+        from tensorflow.keras.models import load_model
+
+        # Check for GPU availability for TensorFlow
+        gpus = tf.config.list_physical_devices('GPU')
+        if gpus:
+            try:
+                for gpu in gpus:
+                    tf.config.experimental.set_memory_growth(gpu, True)
+                print(f"TensorFlow using GPU: {len(gpus)} device(s)")
+            except RuntimeError as e:
+                print(f"TensorFlow GPU Error: {e}")
+        else:
+            print("TensorFlow using CPU")
+
+        self.model = load_model(model_path)
+
+    def predict(self, batch_np):
+        # Use call instead of predict for speed
+        return self.model(batch_np, training=False).numpy()
+
+
+class OnnxEye:
+    def __init__(self, model_path: str):
+        import onnxruntime as ort
+
+        self.session = ort.InferenceSession(model_path, providers=ort.get_available_providers())
+        self.input_name = self.session.get_inputs()[0].name
+
+    def predict(self, batch_np):
+        return self.session.run(None, {self.input_name: batch_np})[0]
+
+
+class TFLiteEye:
+    def __init__(self, model_path: str):
+        self.interpreter = _load_tflite_interpreter(model_path)
+        self.input_index = self.interpreter.get_input_details()[0]["index"]
+        self.output_index = self.interpreter.get_output_details()[0]["index"]
+        self.batch_size = None
+        # TFLite interpreters are not thread-safe
+        self._lock = threading.Lock()
+
+    def predict(self, batch_np):
+        with self._lock:
+            # The detector pads eye batches to a fixed size, so this resize happens once
+            if batch_np.shape[0] != self.batch_size:
+                self.interpreter.resize_tensor_input(self.input_index, batch_np.shape)
+                self.interpreter.allocate_tensors()
+                self.batch_size = batch_np.shape[0]
+            self.interpreter.set_tensor(self.input_index, batch_np)
+            self.interpreter.invoke()
+            return self.interpreter.get_tensor(self.output_index).copy()
+
+
+def load_yolo_backend(backend: str, model_path: str):
+    if backend == "native":
+        return UltralyticsYolo(model_path)
+    if backend == "onnx":
+        return OnnxYolo(exported_path(model_path, "onnx"))
+    if backend == "tflite":
+        return TFLiteYolo(exported_path(model_path, "tflite"))
+    raise ValueError(f"Unknown backend: {backend} (expected one of {BACKENDS})")
+
+
+def load_eye_backend(backend: str, model_path: str):
+    if backend == "native":
+        return KerasEye(model_path)
+    if backend == "onnx":
+        return OnnxEye(exported_path(model_path, "onnx"))
+    if backend == "tflite":
+        return TFLiteEye(exported_path(model_path, "tflite"))
+    raise ValueError(f"Unknown backend: {backend} (expected one of {BACKENDS})")
+
+
+# ---------------- EXPORT ----------------
+
+def export_yolo(model_path: str, backend: str, imgsz: int = 640) -> str:
+    from ultralytics import YOLO
+
+    model = YOLO(model_path)
+    if backend == "onnx":
+        # dynamic batch so micro-batches can be sent in one run later
+        produced = model.export(format="onnx", imgsz=imgsz, dynamic=True)
+    else:
+        produced = model.export(format="tflite", imgsz=imgsz)
+
+    output_path = exported_path(model_path, backend)
+    if os.path.abspath(produced) != os.path.abspath(output_path):
+        os.replace(produced, output_path)
+
+    with open(_metadata_path(output_path), "w") as f:
+        json.dump({"names": {str(k): v for k, v in model.names.items()}, "imgsz": [imgsz, imgsz]}, f)
+
+    print(f"YOLO exported to {output_path}")
+    return output_path
+
+
+def export_eye(model_path: str, backend: str, img_size) -> str:
+    import tensorflow as tf
+    from tensorflow.keras.models import load_model
+
+    model = load_model(model_path)
+    output_path = exported_path(model_path, backend)
+    if backend == "onnx":
+        import tf2onnx
+
+        spec = (tf.TensorSpec((None, *img_size, 1), tf.float32, name="input"),)
+        tf2onnx.convert.from_keras(model, input_signature=spec, output_path=output_path)
+    else:
+        converter = tf.lite.TFLiteConverter.from_keras_model(model)
+        with open(output_path, "wb") as f:
+            f.write(converter.convert())
+
+    print(f"Eye model exported to {output_path}")
+    return output_path
+
+
+# ---------------- PARITY ----------------
+
+def _sample_frames(video_path, num_frames):
+    # Real footage: YOLO finds nothing in noise, which would leave the box check with nothing to compare
+    cap = cv2.VideoCapture(video_path)
+    total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    frames = []
+    for idx in np.linspace(0, max(total - 1, 0), num_frames).astype(int):
+        cap.set(cv2.CAP_PROP_POS_FRAMES, int(idx))
+        ret, frame = cap.read()
+        if ret:
+            frames.append(frame)
+    cap.release()
+    if not frames:
+        raise ValueError(f"Could not read frames from {video_path}")
+    return frames
+
+
+def _iou(a, b):
+    x1, y1 = max(a[0], b[0]), max(a[1], b[1])
+    x2, y2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0.0, x2 - x1) * max(0.0, y2 - y1)
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 1.0
+
+
+def check_parity(backend, yolo_path, eye_path, img_size, video_path, num_frames=16,
+                 min_iou=0.9, max_prob_diff=1e-3):
+    """
+    Compares an exported backend against the native models on frames sampled
+    from video_path. YOLO must agree on the top box class with IoU >= min_iou;
+    the eye model must agree on every argmax with probabilities within
+    max_prob_diff. The check fails when no frame gave both backends a box,
+    since the boxes were then never compared.
+    """
+    frames = _sample_frames(video_path, num_frames)
+
+    native_yolo = load_yolo_backend("native", yolo_path)
+    other_yolo = load_yolo_backend(backend, yolo_path)
+    yolo_mismatches = 0
+    ious = []
+    for ref, got in zip(native_yolo.detect(frames), other_yolo.detect(frames)):
+        if not ref and not got:
+            continue
+        if not ref or not got or ref[0].class_name != got[0].class_name:
+            yolo_mismatches += 1
+            continue
+        ious.append(_iou(ref[0].xyxy, got[0].xyxy))
+
+    # Grayscale frames at the eye-model resolution stand in for eye crops
+    batch_np = np.stack([
+        cv2.resize(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY), (img_size[1], img_size[0])) / 255.0
+        for frame in frames
+    ]).astype(np.float32)[..., None]
+    native_probs = load_eye_backend("native", eye_path).predict(batch_np)
+    other_probs = load_eye_backend(backend, eye_path).predict(batch_np)
+
+    report = {
+        "frames": len(frames),
+        "yolo_boxes_compared": len(ious),
+        "yolo_class_mismatches": yolo_mismatches,
+        "yolo_min_iou": min(ious) if ious else 1.0,
+        "eye_argmax_agreement": float(np.mean(native_probs.argmax(axis=1) == other_probs.argmax(axis=1))),
+        "eye_max_prob_diff": float(np.abs(native_probs - other_probs).max()),
+    }
+    report["passed"] = (
+        report["yolo_boxes_compared"] > 0
+        and report["yolo_class_mismatches"] == 0
+        and report["yolo_min_iou"] >= min_iou
+        and report["eye_argmax_agreement"] == 1.0
+        and report["eye_max_prob_diff"] <= max_prob_diff
+    )
+    return report
+
+
+if __name__ == "__main__":
+    from SimpleCheatingDetector import MODEL_2_PATH, EYE_MODEL_PATH, IMG_SIZE
+
+    parser = argparse.ArgumentParser(description="Export the detector models and check backend parity.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    export_cmd = sub.add_parser("export", help="Export modelv8-2.pt and eye_modelv3.h5")
+    export_cmd.add_argument("--format", choices=EXPORT_EXTENSIONS, default="onnx")
+
+    parity_cmd = sub.add_parser("parity", help="Compare an exported backend against the native models")
+    parity_cmd.add_argument("--backend", choices=EXPORT_EXTENSIONS, default="onnx")
+    parity_cmd.add_argument("--video", required=True, help="Video with a face in view to sample frames from")
+    parity_cmd.add_argument("--frames", type=int, default=16)
+
+    args = parser.parse_args()
+
+    if args.command == "export":
+        export_yolo(MODEL_2_PATH, args.format)
+        export_eye(EYE_MODEL_PATH, args.format, IMG_SIZE)
+    else:
+        report = check_parity(args.backend, MODEL_2_PATH, EYE_MODEL_PATH, IMG_SIZE, args.video, args.frames)
+        print(json.dumps(report, indent=2))
+        if not report["yolo_boxes_compared"]:
+            print("No frame gave both backends a box; use a video with a face in view")
+        raise SystemExit(0 if report["passed"] else 1)
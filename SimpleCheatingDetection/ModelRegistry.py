@@ -0,0 +1,66 @@
+import threading
+import time
+
+from ModelBackends import load_yolo_backend, load_eye_backend
+
+
+class ModelRegistry:
+    """
+    Process-wide cache of loaded models. Each model is loaded once, on first
+    use, and shared by every detector handed out afterwards, so only the
+    first job in a process pays for framework imports and weight loading.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._models = {}
+        # Seconds spent loading each model, keyed like the cache
+        self.load_times = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _get(self, key, loader):
+        with self._lock:
+            if key in self._models:
+                self.hits += 1
+                return self._models[key]
+
+            self.misses += 1
+            t0 = time.perf_counter()
+            model = loader()
+            self.load_times[key] = time.perf_counter() - t0
+            print(f"Loaded {key[0]} ({key[1]}) in {self.load_times[key]:.2f}s")
+            self._models[key] = model
+            return model
+
+    def yolo(self, backend: str, model_path: str):
+        return self._get(("yolo", backend, model_path), lambda: load_yolo_backend(backend, model_path))
+
+    def eye(self, backend: str, model_path: str):
+        return self._get(("eye", backend, model_path), lambda: load_eye_backend(backend, model_path))
+
+    def asset(self, path: str) -> bytes:
+        # MediaPipe landmarkers are stateful per video, so only their model bytes are shared
+        def read():
+            with open(path, "rb") as f:
+                return f.read()
+        return self._get(("asset", "bytes", path), read)
+
+    def get_detector(self, **detector_kwargs):
+        """Returns a SimpleCheatingDetector with its models already loaded."""
+        from SimpleCheatingDetector import SimpleCheatingDetector
+
+        detector = SimpleCheatingDetector(**detector_kwargs)
+        detector.load_models()
+        return detector
+
+    def stats(self):
+        return {
+            "loaded": [f"{kind}:{backend}" for kind, backend, _ in self._models],
+            "load_times": {f"{kind}:{backend}": t for (kind, backend, _), t in self.load_times.items()},
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+MODEL_REGISTRY = ModelRegistry()
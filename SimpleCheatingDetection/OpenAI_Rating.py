@@ -1,36 +1,159 @@
 import os
 import json
-from openai import OpenAI
+import shutil
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from openai import OpenAI, APIConnectionError, RateLimitError, InternalServerError
 from dotenv import load_dotenv
+from MediaGraph import ffmpeg_exe, probe
+from ResultCache import RESULT_CACHE, file_digest
 
 load_dotenv()
 
 
+SILENCE_WINDOW = 0.05  # Seconds per loudness window when looking for quiet cut points
+SILENCE_RATE = 16000   # Whisper works at 16 kHz mono, so chunks are analyzed and encoded at that
+
+
 class InterviewRater:
-    def __init__(self, api_key: str | None = None):
+    def __init__(self, api_key: str | None = None, base_url: str | None = None,
+                 chunk_seconds: float = 300.0, max_concurrency: int = 4, max_retries: int = 3,
+                 cache=RESULT_CACHE):
         self.client = OpenAI(
-            api_key=api_key or os.getenv("OPENAI_API_KEY")
+            api_key=api_key or os.getenv("OPENAI_API_KEY"),
+            # None keeps the SDK default (or OPENAI_BASE_URL); point it at a local server to test
+            base_url=base_url
         )
+        # Audio longer than this is split at quiet moments and transcribed chunk by chunk
+        self.chunk_seconds = chunk_seconds
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        # Transcripts, Q&A pairs and ratings are reused across runs; None turns caching off
+        self.cache = cache
 
     # ---------------- TRANSCRIPTION ---------------- #
 
     def get_transcription(self, audio_file_path: str) -> str:
+        segments = self.get_transcription_segments(audio_file_path)
+        return " ".join(segment["text"].strip() for segment in segments if segment["text"].strip())
+
+    def get_transcription_segments(self, audio_file_path: str) -> list:
+        """
+        Transcribes the audio in chunks split at quiet moments, several chunks
+        at a time, and returns [{"start", "end", "text"}] in order with times
+        relative to the whole file.
+        """
         if not os.path.exists(audio_file_path):
             raise FileNotFoundError(f"Audio file not found: {audio_file_path}")
 
         if os.path.getsize(audio_file_path) == 0:
             raise ValueError("Audio file is empty")
 
-        print("🎧 Transcribing audio...")
-
-        with open(audio_file_path, "rb") as audio_file:
-            transcription = self.client.audio.transcriptions.create(
-                file=audio_file,
-                model="whisper-1",
-                language="en"
-            )
+        if self.cache is None:
+            return self._transcribe_segments(audio_file_path)
+
+        # Same audio bytes, same transcript, however the file was named or produced
+        key = self.cache.key("transcript", "whisper-1", "en", file_digest(audio_file_path))
+        return self.cache.get_or_compute(key, lambda: self._transcribe_segments(audio_file_path))
+
+    def _transcribe_segments(self, audio_file_path: str) -> list:
+        duration = probe(audio_file_path).duration
+        cuts = self._find_cut_points(audio_file_path, duration)
+        bounds = list(zip([0.0] + cuts, cuts + [duration]))
+
+        print(f"🎧 Transcribing audio in {len(bounds)} chunk(s)...")
+
+        work_dir = tempfile.mkdtemp(prefix="transcribe_")
+        try:
+            def transcribe(i):
+                start, end = bounds[i]
+                chunk_path = os.path.join(work_dir, f"{i:04d}.mp3")
+                self._write_chunk(audio_file_path, start, end, chunk_path)
+                return [
+                    {"start": start + s["start"], "end": start + s["end"], "text": s["text"]}
+                    for s in self._transcribe_chunk(chunk_path, end - start)
+                ]
+
+            with ThreadPoolExecutor(max_workers=self.max_concurrency) as pool:
+                chunks = list(pool.map(transcribe, range(len(bounds))))
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+        return [segment for chunk in chunks for segment in chunk]
+
+    def _find_cut_points(self, audio_file_path: str, duration: float) -> list:
+        # Cut roughly every chunk_seconds, at the quietest window of the last fifth before each target
+        if duration <= self.chunk_seconds:
+            return []
+
+        window = int(SILENCE_RATE * SILENCE_WINDOW)
+        proc = subprocess.Popen(
+            [ffmpeg_exe(), "-hide_banner", "-loglevel", "error", "-i", audio_file_path, "-vn",
+             "-f", "s16le", "-ac", "1", "-ar", str(SILENCE_RATE), "-"],
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+        )
+        # Mean energy per window, streamed a minute at a time
+        energies = []
+        while True:
+            data = proc.stdout.read(window * 2 * 1200)
+            if not data:
+                break
+            samples = np.frombuffer(data, dtype=np.int16).astype(np.float32)
+            n = len(samples) // window
+            energies.append(np.square(samples[:n * window]).reshape(n, window).mean(axis=1))
+        proc.wait()
+        energies = np.concatenate(energies) if energies else np.zeros(0, dtype=np.float32)
+
+        cuts = []
+        last = 0.0
+        search = self.chunk_seconds / 5
+        while duration - last > self.chunk_seconds:
+            lo = int((last + self.chunk_seconds - search) / SILENCE_WINDOW)
+            hi = int((last + self.chunk_seconds) / SILENCE_WINDOW)
+            if lo >= len(energies):
+                break
+            quietest = lo + int(np.argmin(energies[lo:hi]))
+            last = (quietest + 0.5) * SILENCE_WINDOW
+            cuts.append(last)
+        return cuts
+
+    def _write_chunk(self, audio_file_path: str, start: float, end: float, chunk_path: str):
+        # Small mono uploads keep every chunk far below the API's file size limit
+        subprocess.run(
+            [ffmpeg_exe(), "-hide_banner", "-loglevel", "error", "-y",
+             "-ss", f"{start:.3f}", "-t", f"{end - start:.3f}", "-i", audio_file_path, "-vn",
+             "-ac", "1", "-ar", str(SILENCE_RATE), "-c:a", "libmp3lame", "-b:a", "64k", chunk_path],
+            check=True, capture_output=True
+        )
 
-        return transcription.text
+    def _transcribe_chunk(self, chunk_path: str, chunk_duration: float) -> list:
+        # Retries are ours, with backoff, so the SDK's own retries are turned off here
+        client = self.client.with_options(max_retries=0)
+        for attempt in range(self.max_retries + 1):
+            try:
+                with open(chunk_path, "rb") as audio_file:
+                    transcription = client.audio.transcriptions.create(
+                        file=audio_file,
+                        model="whisper-1",
+                        language="en",
+                        response_format="verbose_json"
+                    )
+                break
+            # Timeouts, dropped connections, 429s and 5xx are worth another try; 4xx errors are not
+            except (APIConnectionError, RateLimitError, InternalServerError) as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = 2 ** attempt
+                print(f"Transcription of {os.path.basename(chunk_path)} failed ({e}); retrying in {delay}s")
+                time.sleep(delay)
+
+        segments = getattr(transcription, "segments", None)
+        if not segments:
+            return [{"start": 0.0, "end": chunk_duration, "text": transcription.text}]
+        return [{"start": s.start, "end": s.end, "text": s.text} for s in segments]
 
     # ---------------- Q&A EXTRACTION ---------------- #
 
@@ -51,13 +174,7 @@ Transcription:
 \"\"\"{transcription_text}\"\"\"
 """
 
-        response = self.client.responses.create(
-            model="gpt-5",
-            reasoning={"effort": "medium"},
-            input=prompt,
-        )
-
-        return json.loads(response.output_text)
+        return self._respond("qa_pairs", prompt)
 
     # ---------------- RATINGS ---------------- #
 
@@ -98,13 +215,23 @@ Q&A Pairs:
 {json.dumps(qa_pairs, indent=2)}
 """
 
-        response = self.client.responses.create(
-            model="gpt-5",
-            reasoning={"effort": "medium"},
-            input=prompt,
-        )
+        return self._respond("ratings", prompt)
+
+    def _respond(self, stage: str, prompt: str):
+        def compute():
+            response = self.client.responses.create(
+                model="gpt-5",
+                reasoning={"effort": "medium"},
+                input=prompt,
+            )
+            return json.loads(response.output_text)
+
+        if self.cache is None:
+            return compute()
 
-        return json.loads(response.output_text)
+        # The prompt embeds the stage's input, so unchanged input means a cache hit
+        key = self.cache.key(stage, "gpt-5", "medium", prompt)
+        return self.cache.get_or_compute(key, compute)
 
     # ---------------- PIPELINE ---------------- #
 
@@ -116,4 +243,8 @@ Q&A Pairs:
         print("\n❓ Q&A PAIRS:\n", json.dumps(qa_pairs, indent=2))
 
         ratings = self.rate_qa_pairs(qa_pairs, role)
+
+        if self.cache is not None:
+            stats = self.cache.stats()
+            print(f"Result cache: {stats['hits']} hits, {stats['misses']} misses")
         return ratings
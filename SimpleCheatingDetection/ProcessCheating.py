@@ -1,6 +1,7 @@
 from ExtractAudio import Audio
-from EditVideo import Video
-from SimpleCheatingDetector import SimpleCheatingDetector
+from MediaGraph import MediaGraph
+from ModelRegistry import MODEL_REGISTRY
+from TaskGraph import TaskGraph
 import os
 import time
 from OpenAI_Rating import InterviewRater
@@ -25,15 +26,34 @@ class ProcessCheating:
     student_audio_video_path_second_pov = "sampled_videos/recording_7aee6f2a_9dcc_4e90_8f27_c4601e9aa73a_1769263329509.mp4",
     eye_closure_threshold=0.009,
     closed_eye_cheat_time=4.0,
-    skip_frames=6):
+    skip_frames=6,
+    yolo_batch_size=4,
+    backend="native",
+    rater=None,
+    annotate=True,
+    render_width=None,
+    render_codec="mp4v"):
         self.teacher_audio_video_path = teacher_audio_video_path
         self.student_audio_video_path = student_audio_video_path
         self.student_audio_video_path_second_pov = student_audio_video_path_second_pov
         self.eye_closure_threshold = eye_closure_threshold
         self.closed_eye_cheat_time = closed_eye_cheat_time
         self.skip_frames = skip_frames
+        self.yolo_batch_size = yolo_batch_size
+        self.backend = backend
+        # Anything with rate_interview(audio_path, role); defaults to the OpenAI-backed InterviewRater
+        self.rater = rater
+        # Overlays drawn on the student clips; off, the final cut uses the plain student video
+        self.annotate = annotate
+        self.render_width = render_width
+        self.render_codec = render_codec
         
     def run(self, status_callback=None):
+        """
+        Runs the whole pipeline in the current directory, writing under final_videos/.
+        Returns the cheating intervals, the interview ratings, the {name: path}
+        videos written and the total time.
+        """
         def notify(msg):
             if status_callback:
                 status_callback(msg)
@@ -44,60 +64,68 @@ class ProcessCheating:
         notify("Cleaning up previous runs...")
         remove_non_empty_dir("final_videos")
         
-        notify("Extracting teacher audio...")
-        teacher_audio_path = Audio().extract_audio(self.teacher_audio_video_path)
-        
-        notify("Extracting student audio...")
-        student_audio_path = Audio().extract_audio(self.student_audio_video_path)
-        
-        notify("Overlaying combined audio...")
-        combined_audio_path = Audio().overlay_audio(teacher_audio_path, student_audio_path)
+        def mix_audio():
+            return Audio().mix_audio(self.teacher_audio_video_path, self.student_audio_video_path)
 
-        rater = InterviewRater()
-        results = rater.rate_interview(combined_audio_path, "Software Engineer")
-        notify(results)
-        
-        notify("Muting videos for processing...")
-        teacher_video_path = Video().mute_audio(self.teacher_audio_video_path)
-        student_video_path = Video().mute_audio(self.student_audio_video_path)
-        student_video_path_second_pov = Video().mute_audio(self.student_audio_video_path_second_pov)
-        
-        
-        notify("Initializing Detection Models...")
-        detector = SimpleCheatingDetector(
-            eye_closure_threshold=self.eye_closure_threshold, 
-            closed_eye_cheat_time=self.closed_eye_cheat_time, 
-            skip_frames=self.skip_frames
-        )
-        
-        notify("Detecting cheating intervals (This may take some time)...")
-        detected_student_video_path = detector.process_video(student_video_path)
-        detected_student_video_path_cuts = detector.get_cheating_intervals()
+        def rate_interview(combined_audio_path):
+            rater = self.rater or InterviewRater()
+            return rater.rate_interview(combined_audio_path, "Software Engineer")
 
-        print("Cheating Intervals (in seconds):", detected_student_video_path_cuts)
-        notify(f"Cheating detected in intervals: {detected_student_video_path_cuts}")
-        
-        notify("Overlaying audio back onto student video...")
-        detected_student_audio_video_combined_path = Video().overlay_video_audio(detected_student_video_path, combined_audio_path)
-        
-        notify("Editing final videos (cutting intervals)...")
-        edited_student_audio_video_combined_path = Video().edit_video(
-            process_video_input=detected_student_audio_video_combined_path,
-            final_output_path="final_videos/detected_student_final_video.mp4",
-            cuts=detected_student_video_path_cuts
-        )
-        
-        notify("Editing final videos (second POV)...")
-        edited_student_audio_video_combined_path_second_pov = Video().edit_video(
-            process_video_input=student_video_path_second_pov,
-            final_output_path="final_videos/detected_student_final_video_second_pov.mp4",
-            cuts=detected_student_video_path_cuts
-        )
+        def load_models():
+            return MODEL_REGISTRY.get_detector(
+                eye_closure_threshold=self.eye_closure_threshold,
+                closed_eye_cheat_time=self.closed_eye_cheat_time,
+                skip_frames=self.skip_frames,
+                yolo_batch_size=self.yolo_batch_size,
+                backend=self.backend
+            )
+
+        def detect(detector):
+            # Analysis only: nothing is drawn or encoded until the intervals are known
+            return detector.analyze_video(self.student_audio_video_path)
+
+        def annotate(detector, session):
+            # Overlays are redrawn from the session's detection log, only for the flagged intervals
+            if not self.annotate:
+                return self.student_audio_video_path, None
+            return detector.render_intervals(
+                session, self.student_audio_video_path, width=self.render_width, codec=self.render_codec
+            )
+
+        def report_intervals(session):
+            cuts = session.get_cheating_intervals()
+            print("Cheating Intervals (in seconds):", cuts)
+            notify(f"Cheating detected in intervals: {cuts}")
+
+        def render(session, annotated, combined_audio_path):
+            # Audio overlay, both cuts and the side-by-side merge run as one ffmpeg pass
+            annotated_video_path, annotated_segments = annotated
+            return MediaGraph().render_interview(
+                annotated_video_path=annotated_video_path,
+                audio_path=combined_audio_path,
+                second_pov_path=self.student_audio_video_path_second_pov,
+                cuts=session.get_cheating_intervals(),
+                annotated_segments=annotated_segments
+            )
+
+        # The audio branch (mix -> rating) and the video branch (models -> detection)
+        # only meet at the final render, so they run side by side
+        graph = TaskGraph()
+        graph.add("mix_audio", mix_audio)
+        graph.add("rate_interview", rate_interview, deps=["mix_audio"], on_done=notify)
+        graph.add("load_models", load_models,
+                  on_done=lambda detector: notify(f"Models ready in {detector.startup_time:.2f}s"))
+        graph.add("detect", detect, deps=["load_models"], on_done=report_intervals)
+        graph.add("annotate", annotate, deps=["load_models", "detect"])
+        graph.add("render", render, deps=["detect", "annotate", "mix_audio"])
+
+        notify("Mixing audio, rating the interview and detecting cheating (This may take some time)...")
+        results = graph.run(notify)
+        outputs = results["render"]
+        notify("Step timings: " + ", ".join(f"{name}={t:.2f}s" for name, t in graph.timings.items()))
         
-        if edited_student_audio_video_combined_path and edited_student_audio_video_combined_path_second_pov:
-            notify("Merging clips into final output...")
-            last_video = Video().clip_array(edited_student_audio_video_combined_path, edited_student_audio_video_combined_path_second_pov)
-            print(f"Final video with detected clips and combined audio saved at: {last_video}")
+        if "final" in outputs:
+            print(f"Final video with detected clips and combined audio saved at: {outputs['final']}")
             notify("Processing Complete.")
         else:
             msg = "Skipping final clip array creation: One or both input videos are missing (likely due to no detected cheating intervals)."
@@ -116,6 +144,13 @@ class ProcessCheating:
         print(f"Time in seconds {total_time} sec")
         notify(f"Total time taken: {total_time:.2f} seconds")
 
+        return {
+            "cheating_intervals": results["detect"].get_cheating_intervals(),
+            "ratings": results["rate_interview"],
+            "outputs": outputs,
+            "total_time": total_time
+        }
+
 
 if __name__ == "__main__":
     ProcessCheating().run()
@@ -0,0 +1,114 @@
+import hashlib
+import json
+import os
+import threading
+import uuid
+
+
+def file_digest(path: str) -> str:
+    """SHA-256 of a file's content, read in 1 MB blocks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def evict_lru(cache_dir: str, max_bytes: int, suffix: str):
+    """
+    Removes the least recently used files ending in suffix under cache_dir
+    until they add up to at most max_bytes. Hits refresh an entry's mtime, so
+    mtime order is use order. Temporary files of writes in flight are skipped.
+    """
+    entries = []
+    for root, _, files in os.walk(cache_dir):
+        for name in files:
+            if name.endswith(suffix) and not name.endswith(".tmp" + suffix):
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+
+
+class ResultCache:
+    """
+    Content-addressed on-disk cache for JSON-serializable results (transcripts,
+    Q&A pairs, ratings). Entries are files named by the SHA-256 of their key
+    parts; a hit refreshes the file's mtime, and writes evict the least
+    recently used entries once the directory grows past max_bytes.
+    """
+
+    def __init__(self, cache_dir: str = "cache/results", max_bytes: int = 256 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(*parts) -> str:
+        digest = hashlib.sha256()
+        for part in parts:
+            data = part if isinstance(part, bytes) else str(part).encode("utf-8")
+            # Length prefix, so ("ab", "c") and ("a", "bc") hash differently
+            digest.update(len(data).to_bytes(8, "little"))
+            digest.update(data)
+        return digest.hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], key + ".json")
+
+    def get(self, key: str):
+        """Returns the cached value, or None on a miss."""
+        path = self._path(key)
+        with self._lock:
+            try:
+                with open(path, encoding="utf-8") as f:
+                    value = json.load(f)
+                os.utime(path)
+            except (OSError, ValueError):
+                self.misses += 1
+                return None
+            self.hits += 1
+            return value
+
+    def put(self, key: str, value):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # Write-then-rename, so readers never see a half-written entry
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(value, f)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            self._evict()
+
+    def get_or_compute(self, key: str, compute):
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def _evict(self):
+        evict_lru(self.cache_dir, self.max_bytes, ".json")
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses}
+
+
+RESULT_CACHE = ResultCache()
@@ -1,16 +1,22 @@
 import cv2
+import math
 import numpy as np
 import os
 import time
-from ultralytics import YOLO
-import mediapipe as mp
-from mediapipe.tasks import python
-from mediapipe.tasks.python import vision
-from tensorflow.keras.models import load_model
 from MergeIntervals import MergeIntervals
+from ModelRegistry import MODEL_REGISTRY
+from DetectionCache import DETECTION_CACHE
+from IntervalEngine import IntervalEngine, DIRECTIONS
+from DetectionLog import DetectionLog, NO_BOX, NO_EYE_BOXES, NO_PROBS
+from FrameSampler import FixedSampler, AdaptiveSampler
+from FaceTracking import FaceTracker, box_iou
+from FrameBuffers import FrameBuffers
+from MediaGraph import clamp_cuts
 import uuid
-import torch
-import tensorflow as tf
+import queue
+import threading
+import multiprocessing
+from collections import namedtuple
 
 
 # Constants
@@ -20,57 +26,381 @@ EYE_MODEL_PATH = os.path.join(BASE_DIR, "models", "eye_modelv3.h5")
 FACE_LANDMARKER_PATH = os.path.join(BASE_DIR, "models", "face_landmarker.task")
 IMG_SIZE = (56, 64)
 CLASS_LABELS = ['center', 'left', 'right']
+DIRECTION_CODES = {direction: code for code, direction in enumerate(DIRECTIONS)}
 
-class SimpleCheatingDetector:
-    def __init__(self, eye_closure_threshold=0.009, closed_eye_cheat_time=4.0, skip_frames=6):
-        print("Initializing models...")
-        
-        self.eye_closure_threshold = eye_closure_threshold
-        self.closed_eye_cheat_time = closed_eye_cheat_time
-        self.skip_frames = skip_frames
-        
-        # Check for GPU availability for YOLO
-        self.device = 0 if torch.cuda.is_available() else 'cpu'
-        print(f"YOLO using device: {self.device}")
+# Raw model outputs for one sampled frame, before any threshold is applied.
+# The eye fields are None when MediaPipe found no face, in which case the previous
+# eye state carries over; *_probs is None when the eye crop was empty.
+# In multi-face mode the fields describe the candidate (track person_id), and faces
+# holds (track id, FrameDetection) for everyone in the frame; both are None otherwise.
+FrameDetection = namedtuple(
+    "FrameDetection",
+    ["frame_count", "has_head_tilt", "face_box", "left_eye_box", "right_eye_box",
+     "left_height", "right_height", "left_probs", "right_probs", "faces", "person_id"],
+    defaults=(None, None)
+)
+
+
+class ReplayMismatch(KeyError):
+    """Cached detections lack a frame this run samples, so the cache entry does not fit the run."""
+
+
+class SeekMismatch(RuntimeError):
+    """A shard's seek did not land on the frame asked for, so its frame numbers would be off."""
+
+
+def record_detection(record, face_classes):
+    """The FrameDetection a DetectionLog row was written from, without the multi-face fields."""
+    frame_count, has_head_tilt = int(record["frame"]), bool(record["head_tilt"])
+    face_class = int(record["face_class"])
+    face_box = (*record["face_box"].tolist(), face_classes[face_class]) if face_class >= 0 else None
+    if np.isnan(record["left_open"]):
+        return FrameDetection(frame_count, has_head_tilt, face_box, None, None, None, None, None, None)
+
+    left_box, right_box = record["eye_box"].tolist()
+    left_probs, right_probs = (None if np.isnan(probs[0]) else tuple(probs.tolist()) for probs in record["eye_probs"])
+    return FrameDetection(frame_count, has_head_tilt, face_box, tuple(left_box), tuple(right_box),
+                          float(record["left_open"]), float(record["right_open"]), left_probs, right_probs)
+
+
+def eye_direction(eye_height, probs, eye_closure_threshold):
+    """'closed' below the lid-distance threshold or without a crop, else the eye model's argmax."""
+    if eye_height < eye_closure_threshold or probs is None:
+        return "closed"
+    return CLASS_LABELS[int(np.argmax(probs))]
 
-        # Check for GPU availability for TensorFlow
-        gpus = tf.config.list_physical_devices('GPU')
-        if gpus:
-            try:
-                for gpu in gpus:
-                    tf.config.experimental.set_memory_growth(gpu, True)
-                print(f"TensorFlow using GPU: {len(gpus)} device(s)")
-            except RuntimeError as e:
-                print(f"TensorFlow GPU Error: {e}")
-        else:
-            print("TensorFlow using CPU")
 
-        self.yolo_model = YOLO(MODEL_2_PATH)
-        self.eye_model = load_model(EYE_MODEL_PATH)
-        self.face_landmarker = self._init_mediapipe()
+class PersonState:
+    """
+    One person's head-tilt, closed-eye and gaze state machines and the runs
+    they have finished. DetectionSession keeps these for the candidate; in
+    multi-face mode each tracked face gets just this, not a whole session.
+    """
 
-        self.last_direction = "center"
-        self.direction_start_time = 0  # Changed to video timestamp
+    def __init__(self, closed_eye_cheat_time, fps=0, eye_closure_threshold=0.009):
+        self.closed_eye_cheat_time = closed_eye_cheat_time
+        self.eye_closure_threshold = eye_closure_threshold
+        self.fps = fps
 
+        # Runs in progress are (first, last) sampled frame, None between runs
         self.cheating_frame_list_head_tilt = []
-        self.cheating_detected_head_tilt = False
+        self.head_tilt_run = None
 
         self.cheating_frame_list_eye_tilt = []
         self.cheating_detected_eye_tilt = False
 
         # Gaze tracking (Left/Right)
         self.cheating_frame_list_gaze = []
-        self.gaze_frames = []
+        self.gaze_run = None
 
         # Closed-eye tracking
-        self.closed_eye_start_time = None
-        self.closed_eye_frames = []
+        self.closed_eye_run = None
+
+        # State persistence for frames skipped
+        self.last_left_dir = "center"
+        self.last_right_dir = "center"
+
+        # Last sampled frame this person was seen in
+        self.last_frame = 0
+
+    def advance(self, det):
+        """Advances the state machines with one sampled frame; returns the (left, right) eye directions."""
+        fps = self.fps
+        frame_count = det.frame_count
+        current_video_time = frame_count / fps
+        self.last_frame = frame_count
+
+        # ---------------- HEAD TILT ----------------
+        if det.has_head_tilt:
+            self.head_tilt_run = (self.head_tilt_run[0] if self.head_tilt_run else frame_count, frame_count)
+        elif self.head_tilt_run:
+            self._end_run(self.head_tilt_run, self.cheating_frame_list_head_tilt)
+            self.head_tilt_run = None
+
+        # ---------------- EYE STATE ----------------
+        # Without face landmarks the eye state carries over
+        if det.left_height is not None:
+            self.last_left_dir = eye_direction(det.left_height, det.left_probs, self.eye_closure_threshold)
+            self.last_right_dir = eye_direction(det.right_height, det.right_probs, self.eye_closure_threshold)
+
+        left_dir = self.last_left_dir
+        right_dir = self.last_right_dir
+        
+        # -------- CLOSED EYE CHEATING LOGIC (Updated for video time) --------
+        if left_dir == "closed" and right_dir == "closed":
+            self.closed_eye_run = (self.closed_eye_run[0] if self.closed_eye_run else frame_count, frame_count)
+
+            # Check duration using VIDEO time
+            if current_video_time - self.closed_eye_run[0] / fps >= self.closed_eye_cheat_time:
+                self.cheating_detected_eye_tilt = True
+        else:
+            if self.cheating_detected_eye_tilt and self.closed_eye_run:
+                self.cheating_frame_list_eye_tilt.append(self.closed_eye_run)
+            self.closed_eye_run = None
+            self.cheating_detected_eye_tilt = False
+
+        # -------- GAZE (LEFT/RIGHT) CHEATING LOGIC --------
+        is_looking_away = (left_dir in ["left", "right"]) or (right_dir in ["left", "right"])
+        
+        if is_looking_away:
+            self.gaze_run = (self.gaze_run[0] if self.gaze_run else frame_count, frame_count)
+        elif self.gaze_run:
+            self._end_run(self.gaze_run, self.cheating_frame_list_gaze)
+            self.gaze_run = None
+
+        return left_dir, right_dir
+
+    def _end_run(self, run, intervals):
+        # Keep a finished run if its first and last sampled frames are far enough apart
+        first, last = run
+        if (last - first) / self.fps >= self.closed_eye_cheat_time:
+            intervals.append(run)
+
+    def flush_runs(self):
+        # FLUSH REMAINING INTERVALS
+        if self.head_tilt_run:
+            self._end_run(self.head_tilt_run, self.cheating_frame_list_head_tilt)
+
+        if self.cheating_detected_eye_tilt and self.closed_eye_run:
+            self._end_run(self.closed_eye_run, self.cheating_frame_list_eye_tilt)
+
+        if self.gaze_run:
+            self._end_run(self.gaze_run, self.cheating_frame_list_gaze)
+
+    def has_intervals(self):
+        return bool(self.cheating_frame_list_head_tilt or self.cheating_frame_list_eye_tilt
+                    or self.cheating_frame_list_gaze)
+
+
+class DetectionSession(PersonState):
+    """
+    Per-video analysis state: the interval state machines, overlay state,
+    stage timings and the video's MediaPipe landmarker. The detector only
+    holds models and thresholds, so one loaded detector can run many
+    sessions back-to-back or concurrently from threads.
+    """
+
+    def __init__(self, closed_eye_cheat_time, fps=0, face_landmarker=None, eye_closure_threshold=0.009):
+        super().__init__(closed_eye_cheat_time, fps, eye_closure_threshold)
+        self.video_duration = 0
+        # VIDEO-mode landmarkers need increasing timestamps, so each video gets its own
+        self.face_landmarker = face_landmarker
+        # Annotated video written by process_video, None for analysis-only runs
+        self.output_path = None
+
+        # Every sampled frame as a fixed-size record: the only per-frame history, used for
+        # interval extraction, the detection cache and rendering
+        self.log = DetectionLog()
         
         # Visualization state
         self.last_face_box = None
         self.last_left_eye_box = None
         self.last_right_eye_box = None
 
+        # Multi-face mode: track IDs, a PersonState per live track, the retired tracks that
+        # finished a run, every tracked face's log rows (person = track ID), the other people
+        # in the last sampled frame, and runs of frames with more than one person
+        self.tracker = None
+        self.tracks = {}
+        self.retired_tracks = {}
+        self.faces_log = None
+        self.last_extra_faces = ()
+        self.cheating_frame_list_extra_person = []
+        self.extra_person_run = None
+
+        # Decoded frames waiting for their YOLO micro-batch to fill up
+        self.pending = []
+        self.pending_sampled = 0
+
+        # ROI tracking: crop around the last face, and sampled frames since the last full-frame search
+        self.roi = None
+        self.roi_age = 0
+        # Landmarker for the crops; full-frame searches keep face_landmarker, so neither resets the other's tracking
+        self.roi_landmarker = None
+        # Pixels the models were given and pixels of the frames they came from
+        self.roi_pixels = [0, 0]
+
+        # Decides which frames are analyzed; fed back the state of each analyzed frame
+        self.sampler = None
+
+        # Cached DetectionLog rows, in frame order, and their face class names: when set, the models are not run
+        self.replay = None
+        self.replay_classes = []
+        # Reused RGB, landmark and eye-crop arrays for the models' inputs
+        self.buffers = FrameBuffers(IMG_SIZE)
+
+        # Seconds spent per stage
+        self.stage_timings = {"decode": 0.0, "inference": 0.0, "encode": 0.0}
+
+    def apply_detection(self, det):
+        """
+        Advances the candidate's state machines with one sampled frame, updates
+        the overlay state and logs the frame; in multi-face mode also every
+        tracked face's state machines and the extra-person runs.
+        """
+        # ---------------- OVERLAY ----------------
+        self.last_face_box = det.face_box
+        if det.left_height is None:
+            # Reset eye boxes if no face landmarks
+            self.last_left_eye_box = None
+            self.last_right_eye_box = None
+        else:
+            self.last_left_eye_box = det.left_eye_box
+            self.last_right_eye_box = det.right_eye_box
+
+        left_dir, right_dir = self.advance(det)
+        self._log_detection(self.log, det, left_dir, right_dir, det.person_id)
+
+        if self.sampler is not None:
+            self.sampler.observe(det.frame_count, (bool(det.has_head_tilt), left_dir, right_dir))
+
+        if det.faces is not None:
+            self._apply_faces(det)
+
+    def _log_detection(self, log, det, left_dir, right_dir, person):
+        face_class = det.face_box[4] if det.face_box else None
+        if det.left_height is None:
+            heights, eye_boxes, eye_probs = (np.nan, np.nan), NO_EYE_BOXES, (NO_PROBS, NO_PROBS)
+        else:
+            heights = (det.left_height, det.right_height)
+            eye_boxes = (det.left_eye_box, det.right_eye_box)
+            eye_probs = (det.left_probs or NO_PROBS, det.right_probs or NO_PROBS)
+        log.append(
+            det.frame_count, det.frame_count / self.fps, log.face_class_index(face_class), det.has_head_tilt,
+            DIRECTION_CODES[left_dir], DIRECTION_CODES[right_dir], *heights,
+            det.face_box[:4] if det.face_box else NO_BOX, eye_boxes, eye_probs,
+            -1 if person is None else person
+        )
+
+    def _apply_faces(self, det):
+        # Everyone gets their own state machines, the candidate included
+        if self.faces_log is None:
+            self.faces_log = DetectionLog()
+        for track_id, face in det.faces:
+            person = self.tracks.get(track_id)
+            if person is None:
+                person = PersonState(self.closed_eye_cheat_time, self.fps, self.eye_closure_threshold)
+                self.tracks[track_id] = person
+            left_dir, right_dir = person.advance(face)
+            self._log_detection(self.faces_log, face, left_dir, right_dir, track_id)
+        self._retire_tracks(det.frame_count)
+
+        self.last_extra_faces = tuple(
+            (track_id, face.face_box) for track_id, face in det.faces if track_id != det.person_id
+        )
+
+        # -------- EXTRA PERSON LOGIC --------
+        # People are the faces MediaPipe found; a YOLO box alone does not count
+        if sum(face.left_height is not None for _, face in det.faces) > 1:
+            self.extra_person_run = (self.extra_person_run[0] if self.extra_person_run else det.frame_count,
+                                     det.frame_count)
+        elif self.extra_person_run:
+            self._end_run(self.extra_person_run, self.cheating_frame_list_extra_person)
+            self.extra_person_run = None
+
+    def _retire_tracks(self, frame_count):
+        # Same rule as FaceTracker, applied in frame order: a track unseen for max_age frames is over.
+        # Only the runs it finished are kept, and only if there are any
+        for track_id, person in list(self.tracks.items()):
+            if frame_count - person.last_frame > self.tracker.max_age:
+                del self.tracks[track_id]
+                person.flush_runs()
+                if person.has_intervals():
+                    self.retired_tracks[track_id] = person
+
+    def flush_intervals(self):
+        self.flush_runs()
+
+        if self.extra_person_run:
+            self._end_run(self.extra_person_run, self.cheating_frame_list_extra_person)
+
+        for person in self.tracks.values():
+            person.flush_runs()
+
+    def overlay_snapshot(self):
+        # Boxes are immutable tuples, so this snapshot stays valid after later frames
+        return (
+            self.last_face_box,
+            self.last_left_eye_box,
+            self.last_right_eye_box,
+            self.last_left_dir,
+            self.last_right_dir,
+            self.last_extra_faces
+        )
+
+    def close(self):
+        for landmarker in (self.face_landmarker, self.roi_landmarker):
+            if landmarker is not None:
+                landmarker.close()
+        self.face_landmarker = None
+        self.roi_landmarker = None
+
+    def get_cheating_intervals(self):
+        intervals = []
+        if self.fps == 0:
+            return intervals
+
+        # Include gaze and extra-person intervals in the merge
+        all_intervals = (
+            self.cheating_frame_list_head_tilt +
+            self.cheating_frame_list_eye_tilt +
+            self.cheating_frame_list_gaze +
+            self.cheating_frame_list_extra_person
+        )
+
+        for start, end in all_intervals:
+            if start != end:
+                intervals.append((
+                    max(0, start / self.fps - 10),
+                    min(self.video_duration, end / self.fps + 10)
+                ))
+
+        return MergeIntervals().merge(intervals)
+
+
+class SimpleCheatingDetector:
+    def __init__(self, eye_closure_threshold=0.009, closed_eye_cheat_time=4.0, skip_frames=6, yolo_batch_size=4,
+                 backend="native", detection_cache=DETECTION_CACHE, roi_tracking=False, roi_margin=0.5,
+                 roi_refresh=10, adaptive_sampling=False, sampling_budget=1.0, motion_threshold=4.0,
+                 multi_face=False, max_faces=4):
+        self.eye_closure_threshold = eye_closure_threshold
+        self.closed_eye_cheat_time = closed_eye_cheat_time
+        self.skip_frames = skip_frames
+        # Sampled frames sent to YOLO per call
+        self.yolo_batch_size = max(1, int(yolo_batch_size))
+
+        # "native" (Ultralytics + Keras), "onnx" or "tflite"; see ModelBackends.py
+        self.backend = backend
+
+        # Models come from the process-wide registry on first use (see load_models)
+        self.yolo_model = None
+        self.eye_model = None
+        # Seconds load_models() took: the full load on a cold process, ~0 when warm
+        self.startup_time = None
+
+        # Raw per-frame outputs by video, so new thresholds skip the models; None disables it
+        self.detection_cache = detection_cache
+
+        # ROI mode runs YOLO and MediaPipe on the last face box grown by roi_margin of its
+        # size per side, with a full-frame search on loss and every roi_refresh sampled frames
+        self.roi_tracking = roi_tracking
+        self.roi_margin = roi_margin
+        self.roi_refresh = max(1, int(roi_refresh))
+
+        # Adaptive sampling replaces the fixed skip_frames stride with motion- and state-driven
+        # sampling, analyzing at most sampling_budget times as many frames; see FrameSampler.py
+        self.adaptive_sampling = adaptive_sampling
+        self.sampling_budget = sampling_budget
+        self.motion_threshold = motion_threshold
+
+        # Multi-face mode tracks up to max_faces people with their own state and flags frames
+        # with more than one person; the session's own intervals follow the candidate
+        self.multi_face = multi_face
+        self.max_faces = max(1, int(max_faces))
+
+        # Session of the most recent video, for get_cheating_intervals()
+        self.last_session = None
+
         self.colors = {
             "cheating": (0, 0, 255),
             "normal": (0, 255, 0),
@@ -78,67 +408,612 @@ class SimpleCheatingDetector:
             "closed": (128, 128, 128)
         }
 
-        self.video_duration = 0
-        self.fps = 0 # Initialize fps
+    def load_models(self):
+        """Fetches YOLO and the eye model from the registry, loading them only if this process has not yet."""
+        if self.yolo_model is not None:
+            return
+
+        print("Initializing models...")
+        t0 = time.perf_counter()
+        self.yolo_model = MODEL_REGISTRY.yolo(self.backend, MODEL_2_PATH)
+        self.eye_model = MODEL_REGISTRY.eye(self.backend, EYE_MODEL_PATH)
+        self.startup_time = time.perf_counter() - t0
+        print(f"Models ready in {self.startup_time:.2f}s")
+
+    def new_session(self, fps, replay=None):
+        """
+        Starts the state for one video, with its own landmarker unless it replays
+        cached detections (a DetectionLog).
+        """
+        if replay is None:
+            self.load_models()
+            session = DetectionSession(self.closed_eye_cheat_time, fps, self._init_mediapipe(),
+                                       self.eye_closure_threshold)
+            if self.roi_tracking and not self.multi_face:
+                session.roi_landmarker = self._init_mediapipe()
+        else:
+            session = DetectionSession(self.closed_eye_cheat_time, fps, eye_closure_threshold=self.eye_closure_threshold)
+            session.replay = replay.view()
+            session.replay_classes = list(replay.face_classes)
+        session.sampler = self._new_sampler()
+        if self.multi_face:
+            # Someone out of view for two seconds comes back under a new ID
+            session.tracker = FaceTracker(max_age=max(1, int(2 * fps)))
+        self.last_session = session
+        return session
+
+    def _new_sampler(self):
+        if self.adaptive_sampling:
+            return AdaptiveSampler(self.skip_frames, self.sampling_budget, self.motion_threshold)
+        return FixedSampler(self.skip_frames)
+
+    def replay_detections(self, log, fps, frame_count):
+        """
+        Rebuilds a session's intervals from a stored DetectionLog with this
+        detector's thresholds. Nothing is drawn, so the eye directions of every
+        row are recomputed at once and the vectorized IntervalEngine replaces
+        the per-frame state machines.
+        """
+        session = DetectionSession(self.closed_eye_cheat_time, fps, eye_closure_threshold=self.eye_closure_threshold)
+        session.video_duration = frame_count / fps if fps else 0
+        if fps:
+            engine = IntervalEngine(fps, self.closed_eye_cheat_time, self.eye_closure_threshold)
+            # view() is a copy unless the log spilled, in which case it is a read-only map
+            records = np.require(log.view(), requirements="W")
+            eye_height = np.stack((records["left_open"], records["right_open"]), axis=1)
+            directions = engine.eye_directions(eye_height, records["eye_probs"])
+            records["time"] = records["frame"] / fps
+            records["left_dir"], records["right_dir"] = directions[:, 0], directions[:, 1]
+            session.log.extend(records, log.face_classes)
+
+            head, closed_eye, gaze = engine.log_intervals(session.log)
+            session.cheating_frame_list_head_tilt = [tuple(iv) for iv in head.tolist()]
+            session.cheating_frame_list_eye_tilt = [tuple(iv) for iv in closed_eye.tolist()]
+            session.cheating_frame_list_gaze = [tuple(iv) for iv in gaze.tolist()]
+        self.last_session = session
+        return session
+
+    def _cache_key(self, input_path):
+        # The cache holds one face per frame, so multi-face runs always use the models
+        if self.detection_cache is None or self.multi_face:
+            return None
+        # Options that change which frames are analyzed, or what the models see, get their own entries
+        variant = []
+        if self.roi_tracking:
+            variant += ["roi", self.roi_margin, self.roi_refresh]
+        if self.adaptive_sampling:
+            variant += ["adaptive", self.sampling_budget, self.motion_threshold]
+        # Both only get feedback once per YOLO micro-batch, so their samples depend on its size
+        if self.roi_tracking or self.adaptive_sampling:
+            variant += ["batch", self.yolo_batch_size]
+        return self.detection_cache.key(input_path, self.skip_frames, self.backend, *variant)
+
+    def _load_cached(self, key):
+        if key is None:
+            return None
+        cached = self.detection_cache.load(key)
+        if cached is not None:
+            print(f"Using cached detections ({len(cached[0])} sampled frames)")
+        return cached
+
+    def _save_cached(self, key, log, fps, frame_count):
+        if key is not None:
+            self.detection_cache.save(key, log, fps, frame_count)
 
     def _init_mediapipe(self):
-        base_options = python.BaseOptions(model_asset_path=FACE_LANDMARKER_PATH)
+        import mediapipe as mp
+        from mediapipe.tasks import python
+        from mediapipe.tasks.python import vision
+
+        self._mp = mp
+        base_options = python.BaseOptions(model_asset_buffer=MODEL_REGISTRY.asset(FACE_LANDMARKER_PATH))
         options = vision.FaceLandmarkerOptions(
             base_options=base_options,
             running_mode=vision.RunningMode.VIDEO,
-            num_faces=1,
+            num_faces=self.max_faces if self.multi_face else 1,
             min_face_detection_confidence=0.5,
             min_tracking_confidence=0.5
         )
         return vision.FaceLandmarker.create_from_options(options)
 
-    def _get_eye_image(self, gray_frame, landmarks, indices):
-        """Extracts eye image and checks closure. Returns (image, status, bbox)."""
-        h, w = gray_frame.shape
+    # ---------------- ROI TRACKING ----------------
 
-        if indices == [33, 133, 159, 145]: # Left eye indices
-            upper_idx, lower_idx = 159, 145
-        else: # Right eye indices
-            upper_idx, lower_idx = 386, 374
+    def _plan_regions(self, session, batch):
+        """Crop region per frame of a micro-batch, or None for a full-frame search."""
+        regions = []
+        for frame, _ in batch:
+            # A crop around one face would hide everyone else, so multi-face mode searches full frames
+            if (not self.roi_tracking or self.multi_face or session.roi is None
+                    or session.roi_age >= self.roi_refresh):
+                session.roi_age = 0
+                regions.append(None)
+            else:
+                session.roi_age += 1
+                regions.append(session.roi)
+        return regions
 
-        eye_height = abs(landmarks[upper_idx].y - landmarks[lower_idx].y)
-        
-        eye_points_pixel = np.array(
-            [[int(landmarks[i].x * w), int(landmarks[i].y * h)] for i in indices],
-            dtype=np.int64
+    def _roi_around(self, face_box, frame_shape):
+        h, w = frame_shape[:2]
+        x1, y1, x2, y2 = face_box[:4]
+        mx, my = self.roi_margin * (x2 - x1), self.roi_margin * (y2 - y1)
+        return (max(0, int(x1 - mx)), max(0, int(y1 - my)), min(w, int(x2 + mx)), min(h, int(y2 + my)))
+
+    def _report_roi(self, session):
+        analyzed, full = session.roi_pixels
+        if self.roi_tracking and full:
+            print(f"ROI tracking: models saw {analyzed / full:.0%} of the sampled frames' pixels")
+
+    def _update_roi(self, session, det, frame_shape):
+        if det.face_box is None or det.left_height is None:
+            # Lost the face: the next sampled frame searches the whole frame
+            session.roi = None
+            return
+        # The crop stays put while the face is well inside it, so MediaPipe's tracker sees a steady view
+        x1, y1, x2, y2 = det.face_box[:4]
+        inset_x, inset_y = self.roi_margin * (x2 - x1) / 4, self.roi_margin * (y2 - y1) / 4
+        roi = session.roi
+        if (roi is None or x1 - inset_x < roi[0] or y1 - inset_y < roi[1]
+                or x2 + inset_x > roi[2] or y2 + inset_y > roi[3]):
+            session.roi = self._roi_around(det.face_box, frame_shape)
+
+    def _detect_frame(self, session, frame, frame_count, boxes, region=None):
+        """
+        Runs MediaPipe on a sampled frame, or on its `region` crop in ROI mode.
+        Returns a FrameDetection whose eye probabilities are still unresolved,
+        plus the (field, eye slot) pairs staged for the eye model.
+        """
+        fps = session.fps
+
+        # ---------------- YOLO HEAD TILT ----------------
+        has_head_tilt = False
+        face_box = None # Reset if no face found this frame
+
+        for box in boxes:
+            class_name = box.class_name
+
+            # Store box for visualization
+            x1, y1, x2, y2 = map(int, box.xyxy)
+            face_box = (x1, y1, x2, y2, class_name)
+
+            if class_name == "cheating":
+                has_head_tilt = True
+                break # Prioritize cheating detection
+
+        # ---------------- EYE TRACKING ----------------
+        if region is None:
+            rgb_frame = session.buffers.rgb(frame)
+        else:
+            x1, y1, x2, y2 = region
+            rgb_frame = session.buffers.rgb(frame[y1:y2, x1:x2])
+        mp_image = self._mp.Image(image_format=self._mp.ImageFormat.SRGB, data=rgb_frame)
+
+        frame_timestamp_ms = int((frame_count * 1000) / fps)
+        landmarker = session.face_landmarker if region is None else session.roi_landmarker
+        detection = landmarker.detect_for_video(
+            mp_image, frame_timestamp_ms
         )
 
-        x1, y1 = np.min(eye_points_pixel, axis=0)
-        x2, y2 = np.max(eye_points_pixel, axis=0)
-        
-        # Add padding check or clamp
-        x1, y1 = max(0, x1), max(0, y1)
-        x2, y2 = min(w, x2), min(h, y2)
-        
-        bbox = (x1, y1, x2, y2)
+        # No face landmarks: eye state carries over from the last sampled frame
+        if not detection.face_landmarks:
+            return FrameDetection(frame_count, has_head_tilt, face_box, None, None, None, None, None, None), []
+
+        return self._eye_detection(session, frame, frame_count, has_head_tilt, face_box,
+                                   detection.face_landmarks[0], region)
+
+    def _detect_faces(self, session, frame, frame_count, boxes):
+        """
+        Multi-face version of _detect_frame: one (FrameDetection, eye slots) pair
+        per person. Each MediaPipe face joins the smallest YOLO box holding its nose
+        tip; a face outside every box gets its landmark bounds as a "face" box, and
+        a box without a face gets no eyes.
+        """
+        boxes = self._dedupe_boxes(boxes)
+        rgb_frame = session.buffers.rgb(frame)
+        mp_image = self._mp.Image(image_format=self._mp.ImageFormat.SRGB, data=rgb_frame)
+        detection = session.face_landmarker.detect_for_video(mp_image, int((frame_count * 1000) / session.fps))
+
+        h, w = frame.shape[:2]
+        people = [tuple(map(int, box.xyxy)) + (box.class_name,) for box in boxes]
+        people_landmarks = [None] * len(people)
+
+        for landmarks in detection.face_landmarks:
+            nose_x, nose_y = landmarks[1].x * w, landmarks[1].y * h
+            holding = [i for i, (x1, y1, x2, y2, _) in enumerate(people)
+                       if people_landmarks[i] is None and x1 <= nose_x <= x2 and y1 <= nose_y <= y2]
+            if holding:
+                i = min(holding, key=lambda i: (people[i][2] - people[i][0]) * (people[i][3] - people[i][1]))
+                people_landmarks[i] = landmarks
+            else:
+                xs = [lm.x * w for lm in landmarks]
+                ys = [lm.y * h for lm in landmarks]
+                people.append((int(min(xs)), int(min(ys)), int(max(xs)), int(max(ys)), "face"))
+                people_landmarks.append(landmarks)
+
+        faces = []
+        for face_box, landmarks in zip(people, people_landmarks):
+            has_head_tilt = face_box[4] == "cheating"
+            if landmarks is None:
+                faces.append((FrameDetection(frame_count, has_head_tilt, face_box, None, None, None, None, None, None), []))
+            else:
+                faces.append(self._eye_detection(session, frame, frame_count, has_head_tilt, face_box, landmarks))
+        return faces
+
+    @staticmethod
+    def _dedupe_boxes(boxes, iou_threshold=0.5):
+        """
+        YOLO's NMS works per class, so one face can come back as both a "cheating"
+        and a "normal" box. Of boxes overlapping by iou_threshold or more only one
+        is kept: "cheating" first, as in _detect_frame, then the most confident.
+        """
+        if len(boxes) < 2:
+            return list(boxes)
+        iou = box_iou([box.xyxy for box in boxes], [box.xyxy for box in boxes])
+        kept = []
+        for i in sorted(range(len(boxes)), key=lambda i: (boxes[i].class_name != "cheating", -boxes[i].conf)):
+            if all(iou[i, k] < iou_threshold for k in kept):
+                kept.append(i)
+        return [boxes[i] for i in sorted(kept)]
+
+    def _track_faces(self, session, frame_count, faces):
+        # The candidate's face is the session's detection; everyone rides along in faces
+        ids = session.tracker.update(frame_count, [face.face_box for face in faces],
+                                     [face.left_height is not None for face in faces])
+        person_id = session.tracker.primary()
+        entries = tuple(zip(ids, faces))
+        for track_id, face in entries:
+            if track_id == person_id:
+                return face._replace(faces=entries, person_id=person_id)
+        return FrameDetection(frame_count, False, None, None, None, None, None, None, None, entries, person_id)
+
+    def _eye_detection(self, session, frame, frame_count, has_head_tilt, face_box, landmarks, region=None):
+        """
+        Lid distances and eye boxes from the landmarks (normalized to `region` when
+        MediaPipe ran on a crop). Returns the FrameDetection, its eye probabilities
+        still unresolved, and the (field, eye slot) pairs staged for the eye model.
+        """
+        buffers = session.buffers
+        l_height, r_height = buffers.eye_geometry(landmarks, frame.shape, region)
+        l_bbox, r_bbox = (tuple(box) for box in buffers.boxes.tolist())
+
+        # Closure is decided later against eye_closure_threshold, so every crop is
+        # classified; only the eye is converted to gray, not the whole frame
+        eyes_to_process = []
+        for field, (x1, y1, x2, y2) in (("left_probs", l_bbox), ("right_probs", r_bbox)):
+            if x2 > x1 and y2 > y1:
+                eyes_to_process.append((field, buffers.stage_eye(frame[y1:y2, x1:x2])))
+
+        det = FrameDetection(frame_count, has_head_tilt, face_box, l_bbox, r_bbox, l_height, r_height, None, None)
+        return det, eyes_to_process
+
+    def _classify_eyes(self, session):
+        """
+        Classifies the eye crops staged for a micro-batch in one eye-model call.
+        Returns probabilities by eye slot. The batch is zero-padded to a fixed size
+        (two eyes per YOLO batch slot) so the model always sees the same input shape.
+        """
+        buffers = session.buffers
+        preds = self.eye_model.predict(buffers.eye_inputs(2 * self.yolo_batch_size))[:buffers.eye_count]
+        return [tuple(float(p) for p in row) for row in preds]
+
+    def detect_frames(self, session, batch):
+        """
+        Runs YOLO once over a micro-batch of (frame, frame_count) pairs, MediaPipe
+        per frame in order, then the eye model once over every eye crop.
+        Returns one FrameDetection per pair; feeding them to the session's
+        state machines (apply_detection) is left to the caller. Sessions
+        replaying cached detections skip the models entirely.
+        """
+        if not batch:
+            return []
+        if session.replay is not None:
+            frames = session.replay["frame"]
+            detections = []
+            for _, frame_count in batch:
+                i = np.searchsorted(frames, frame_count)
+                if i == len(frames) or frames[i] != frame_count:
+                    raise ReplayMismatch(frame_count)
+                detections.append(record_detection(session.replay[i], session.replay_classes))
+            return detections
+        regions = self._plan_regions(session, batch)
+        session.buffers.reset_eyes()
+        results = self._detect_boxes(session, batch, regions)
+
+        detections = []
+        eye_slots = []   # (detection index, face index or None, field to fill in, eye slot)
+        for i, (frame, frame_count) in enumerate(batch):
+            boxes, region = results[i], regions[i]
+            if region is not None:
+                # Crop coordinates back to the frame's
+                x, y = region[:2]
+                boxes = [box._replace(xyxy=(box.xyxy[0] + x, box.xyxy[1] + y, box.xyxy[2] + x, box.xyxy[3] + y))
+                         for box in boxes]
+            if self.multi_face:
+                faces = self._detect_faces(session, frame, frame_count, boxes)
+                for k, (_, eyes) in enumerate(faces):
+                    eye_slots.extend((len(detections), k, field, slot) for field, slot in eyes)
+                detections.append([face for face, _ in faces])
+                continue
+            det, eyes = self._detect_frame(session, frame, frame_count, boxes, region)
+            if self.roi_tracking:
+                self._update_roi(session, det, frame.shape)
+                if region is not None and session.roi is None and i + 1 < len(batch):
+                    # Lost the face in the crop: the rest of the micro-batch is replanned as full-frame searches
+                    rest = batch[i + 1:]
+                    regions[i + 1:] = self._plan_regions(session, rest)
+                    results[i + 1:] = self._detect_boxes(session, rest, regions[i + 1:])
+            eye_slots.extend((len(detections), None, field, slot) for field, slot in eyes)
+            detections.append(det)
+
+        # ---------------- EYE DIRECTION (BATCHED) ----------------
+        if eye_slots:
+            probabilities = self._classify_eyes(session)
+            for i, k, field, slot in eye_slots:
+                probs = probabilities[slot]
+                if k is None:
+                    detections[i] = detections[i]._replace(**{field: probs})
+                else:
+                    detections[i][k] = detections[i][k]._replace(**{field: probs})
+
+        if self.multi_face:
+            detections = [self._track_faces(session, frame_count, faces)
+                          for (_, frame_count), faces in zip(batch, detections)]
 
-        if eye_height < self.eye_closure_threshold:
-            return None, "closed", bbox
+        return detections
 
-        eye_img = gray_frame[y1:y2, x1:x2]
+    def _detect_boxes(self, session, batch, regions):
+        """One YOLO call over the frames of `batch`, each cropped to its region."""
+        crops = []
+        for (frame, _), region in zip(batch, regions):
+            crop = frame if region is None else frame[region[1]:region[3], region[0]:region[2]]
+            session.roi_pixels[0] += crop.shape[0] * crop.shape[1]
+            session.roi_pixels[1] += frame.shape[0] * frame.shape[1]
+            crops.append(crop)
+        return list(self.yolo_model.detect(crops))
 
-        if eye_img.size == 0:
-            return None, "closed", bbox
-            
-        return eye_img, "open", bbox
+    def _analyze_batch(self, session, batch):
+        for det in self.detect_frames(session, batch):
+            session.apply_detection(det)
 
-    def process_video(self, input_path: str):
+    def _step(self, session, frame, frame_count):
+        """
+        Queues one decoded frame. Returns the (frame, overlay) pairs that are
+        ready to be drawn, in frame order, once a YOLO micro-batch is full.
+        """
+        # ---------------- FRAME SKIPPING ----------------
+        # Only run heavy models if it's a processing frame
+        sampler = session.sampler
+        sampled = sampler.probes(frame_count) and sampler.sample(frame_count, frame)
+        session.pending.append((frame, frame_count, sampled))
+
+        if sampled:
+            session.pending_sampled += 1
+            if session.pending_sampled >= self.yolo_batch_size:
+                return self._drain_pending(session)
+        return []
+
+    def _drain_pending(self, session):
+        """Analyzes the pending micro-batch and replays the buffered frames through the state machines."""
+        pending = session.pending
+        session.pending = []
+        session.pending_sampled = 0
+
+        detections = iter(self.detect_frames(
+            session, [(frame, frame_count) for frame, frame_count, sampled in pending if sampled]
+        ))
+
+        ready = []
+        for frame, frame_count, sampled in pending:
+            session.video_duration = frame_count / session.fps
+            if sampled:
+                session.apply_detection(next(detections))
+            ready.append((frame, session.overlay_snapshot()))
+        return ready
+
+    def _draw_overlays(self, frame, overlay):
+        face_box, left_eye_box, right_eye_box, left_dir, right_dir, extra_faces = overlay
+
+        # Other people in the frame, by track ID
+        for track_id, box in extra_faces:
+            if box:
+                x1, y1, x2, y2, _ = box
+                cv2.rectangle(frame, (x1, y1), (x2, y2), self.colors["warning"], 2)
+                cv2.putText(frame, f"ID {track_id}", (x1, y1 - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.9, self.colors["warning"], 2)
+
+        # Draw Face Box
+        if face_box:
+            x1, y1, x2, y2, cls_name = face_box
+            color = self.colors.get(cls_name, self.colors["normal"])
+            cv2.rectangle(frame, (x1, y1), (x2, y2), color, 2)
+            cv2.putText(frame, cls_name, (x1, y1 - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.9, color, 2)
+
+        # Draw Eye Boxes and Status
+        for bbox, status, label in [(left_eye_box, left_dir, "L"), (right_eye_box, right_dir, "R")]:
+            if bbox:
+                ex1, ey1, ex2, ey2 = bbox
+                color = self.colors["closed"] if status == "closed" else self.colors["normal"]
+                if status != "center" and status != "closed":
+                     color = self.colors["warning"]
+
+                cv2.rectangle(frame, (ex1, ey1), (ex2, ey2), color, 1)
+                # Show direction text near eye
+                cv2.putText(frame, f"{label}:{status}", (ex1, ey1 - 5), cv2.FONT_HERSHEY_SIMPLEX, 0.4, color, 1)
+
+    def _report_progress(self, frame_count, total_frames, start_process_time):
+        if frame_count % 30 == 0:
+            elapsed = time.time() - start_process_time
+            fps_proc = frame_count / (elapsed + 1e-9)
+            print(f"Frame {frame_count}/{total_frames} | Speed: {fps_proc:.2f} fps", end='\r')
+
+    def _run_sequential(self, session, cap, out, total_frames, start_process_time):
+        timings = session.stage_timings
+        frame_count = 0
+
+        while cap.isOpened():
+            t0 = time.perf_counter()
+            ret, frame = cap.read()
+            timings["decode"] += time.perf_counter() - t0
+            if not ret:
+                break
+
+            frame_count += 1
+
+            t0 = time.perf_counter()
+            ready = self._step(session, frame, frame_count)
+            timings["inference"] += time.perf_counter() - t0
+
+            self._write_frames(session, out, ready)
+
+            # Update progress
+            self._report_progress(frame_count, total_frames, start_process_time)
+
+        t0 = time.perf_counter()
+        ready = self._drain_pending(session)
+        timings["inference"] += time.perf_counter() - t0
+        self._write_frames(session, out, ready)
+
+        return frame_count
+
+    def _write_frames(self, session, out, ready):
+        t0 = time.perf_counter()
+        for frame, overlay in ready:
+            self._draw_overlays(frame, overlay)
+            out.write(frame)
+        session.stage_timings["encode"] += time.perf_counter() - t0
+
+    def _run_pipeline(self, session, cap, out, total_frames, start_process_time, queue_size):
+        """
+        Decoder thread -> inference (this thread) -> annotation/encoder thread,
+        joined by bounded queues. Frames stay in order, so the output is the
+        same as the sequential path; cv2 releases the GIL while decoding and
+        encoding, which lets those stages overlap with the models.
+        """
+        timings = session.stage_timings
+        decode_q = queue.Queue(maxsize=queue_size)
+        encode_q = queue.Queue(maxsize=queue_size)
+        stop = threading.Event()
+        errors = []
+
+        def decoder():
+            try:
+                while not stop.is_set():
+                    t0 = time.perf_counter()
+                    ret, frame = cap.read()
+                    timings["decode"] += time.perf_counter() - t0
+                    if not ret:
+                        break
+                    decode_q.put(frame)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                decode_q.put(None)
+
+        def encoder():
+            try:
+                while True:
+                    item = encode_q.get()
+                    if item is None:
+                        return
+                    self._write_frames(session, out, item)
+            except Exception as e:
+                errors.append(e)
+                stop.set()
+                # Keep draining so the inference stage never blocks on a full queue
+                while encode_q.get() is not None:
+                    pass
+
+        decode_thread = threading.Thread(target=decoder, name="decoder", daemon=True)
+        encode_thread = threading.Thread(target=encoder, name="encoder", daemon=True)
+        decode_thread.start()
+        encode_thread.start()
+
+        frame_count = 0
+        try:
+            while not stop.is_set():
+                frame = decode_q.get()
+                if frame is None:
+                    break
+
+                frame_count += 1
+
+                t0 = time.perf_counter()
+                ready = self._step(session, frame, frame_count)
+                timings["inference"] += time.perf_counter() - t0
+
+                if ready:
+                    encode_q.put(ready)
+
+                # Update progress
+                self._report_progress(frame_count, total_frames, start_process_time)
+
+            if not stop.is_set():
+                t0 = time.perf_counter()
+                ready = self._drain_pending(session)
+                timings["inference"] += time.perf_counter() - t0
+                encode_q.put(ready)
+        except Exception:
+            stop.set()
+            raise
+        finally:
+            # Unblock the decoder if it is waiting on a full queue
+            if stop.is_set():
+                while decode_thread.is_alive():
+                    try:
+                        decode_q.get(timeout=0.1)
+                    except queue.Empty:
+                        pass
+            encode_q.put(None)
+            decode_thread.join()
+            encode_thread.join()
+
+        if errors:
+            raise errors[0]
+
+        return frame_count
+
+    def process_video(self, input_path: str, pipeline: bool = False, queue_size: int = 32):
+        """Analyzes a video and writes the annotated copy; returns its DetectionSession."""
         random_id = str(uuid.uuid4())
         output_path = f"extracted_videos/{random_id}_processed_video.mp4"
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+
+        # The annotated video still has to be decoded and written, but a cache hit skips the models
+        cache_key = self._cache_key(input_path)
+        cached = self._load_cached(cache_key)
+        start_process_time = time.time()
+
+        try:
+            session, frame_count = self._annotate_video(input_path, output_path, cached, pipeline, queue_size)
+        except ReplayMismatch as e:
+            # An entry that does not cover the frames this run samples counts as a miss
+            print(f"\nCached detections have no frame {e.args[0]}; running the models instead")
+            cached = None
+            start_process_time = time.time()
+            session, frame_count = self._annotate_video(input_path, output_path, None, pipeline, queue_size)
+
+        session.flush_intervals()
+        if cached is None:
+            self._save_cached(cache_key, session.log, session.fps, frame_count)
+
+        total_time = time.time() - start_process_time
+        print(f"\nProcessed {frame_count} frames in {total_time:.2f}s ({frame_count/total_time:.2f} fps)")
+        print("Stage timings: " + ", ".join(f"{k}={v:.2f}s" for k, v in session.stage_timings.items()))
+        self._report_roi(session)
+        if self.adaptive_sampling:
+            print(session.sampler.report(frame_count))
         
-        
+        return session
+
+    def _annotate_video(self, input_path, output_path, cached, pipeline, queue_size):
+        """One decode/analyze/encode pass of process_video. Returns (session, frames read)."""
         cap = cv2.VideoCapture(input_path)
         width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
         height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-        self.fps = int(cap.get(cv2.CAP_PROP_FPS))
-        fps = self.fps
+        fps = int(cap.get(cv2.CAP_PROP_FPS))
         total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
 
+        session = self.new_session(fps, replay=cached[0] if cached else None)
+        session.output_path = output_path
+
         out = cv2.VideoWriter(
             output_path,
             cv2.VideoWriter_fourcc(*'mp4v'),
@@ -146,250 +1021,356 @@ class SimpleCheatingDetector:
             (width, height)
         )
 
-        frame_count = 0
-        head_tilt_ls = []
-        
-        # State persistence for frames skipped
-        last_left_dir = "center"
-        last_right_dir = "center"
-        
         print(f"Processing video: {total_frames} frames @ {fps} fps")
         start_process_time = time.time()
 
-        while cap.isOpened():
-            ret, frame = cap.read()
-            if not ret:
-                break
+        try:
+            if pipeline:
+                frame_count = self._run_pipeline(session, cap, out, total_frames, start_process_time, queue_size)
+            else:
+                frame_count = self._run_sequential(session, cap, out, total_frames, start_process_time)
+        finally:
+            cap.release()
+            out.release()
+            session.close()
+        return session, frame_count
 
-            frame_count += 1
-            current_video_time = frame_count / fps
-            self.video_duration = current_video_time
-
-            # ---------------- FRAME SKIPPING ----------------
-            should_process = (frame_count % self.skip_frames == 0)
-
-            # Only run heavy models if it's a processing frame
-            if should_process:
-                # ---------------- YOLO HEAD TILT ----------------
-                results = self.yolo_model(frame, verbose=False, device=self.device)[0]
-                has_head_tilt = False
-                self.last_face_box = None # Reset if no face found this frame
-                
-                for box in results.boxes:
-                    cls = int(box.cls[0])
-                    class_name = self.yolo_model.names[cls]
-                    
-                    # Store box for visualization
-                    x1, y1, x2, y2 = map(int, box.xyxy[0])
-                    self.last_face_box = (x1, y1, x2, y2, class_name)
-                    
-                    if class_name == "cheating":
-                        has_head_tilt = True
-                        break # Prioritize cheating detection
-                
-                if has_head_tilt:
-                    self.cheating_detected_head_tilt = True
-                    head_tilt_ls.append(frame_count)
-                else:
-                    if self.cheating_detected_head_tilt and head_tilt_ls:
-                        # Check duration
-                        duration = (max(head_tilt_ls) - min(head_tilt_ls)) / fps
-                        if duration >= self.closed_eye_cheat_time:
-                            self.cheating_frame_list_head_tilt.append(
-                                (min(head_tilt_ls), max(head_tilt_ls))
-                            )
-                        head_tilt_ls = []
-                        self.cheating_detected_head_tilt = False
-
-                # ---------------- EYE TRACKING ----------------
-                rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                mp_image = mp.Image(image_format=mp.ImageFormat.SRGB, data=rgb_frame)
-                
-                frame_timestamp_ms = int((frame_count * 1000) / fps)
-                detection = self.face_landmarker.detect_for_video(
-                    mp_image, frame_timestamp_ms
-                )
-
-                left_dir = last_left_dir
-                right_dir = last_right_dir
-                
-                # Reset eye boxes if no face landmarks
-                if not detection.face_landmarks:
-                    self.last_left_eye_box = None
-                    self.last_right_eye_box = None
-                
-                if detection.face_landmarks:
-                    landmarks = detection.face_landmarks[0]
-                    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-
-                    # Prepare batch for eye model
-                    eyes_to_process = [] 
-                    eye_indices_map = [] # 0 for left, 1 for right
-
-                    # Left Eye
-                    l_img, l_status, l_bbox = self._get_eye_image(gray, landmarks, [33, 133, 159, 145])
-                    self.last_left_eye_box = l_bbox
-                    
-                    if l_status == "closed":
-                        left_dir = "closed"
-                    else:
-                        eyes_to_process.append(l_img)
-                        eye_indices_map.append(0)
-
-                    # Right Eye
-                    r_img, r_status, r_bbox = self._get_eye_image(gray, landmarks, [362, 263, 386, 374])
-                    self.last_right_eye_box = r_bbox
-                    
-                    if r_status == "closed":
-                        right_dir = "closed"
-                    else:
-                        eyes_to_process.append(r_img)
-                        eye_indices_map.append(1)
-
-                    # Batch Predict
-                    if eyes_to_process:
-                        batch = []
-                        for img in eyes_to_process:
-                            processed = cv2.resize(img, (IMG_SIZE[1], IMG_SIZE[0]))
-                            processed = processed / 255.0
-                            batch.append(processed)
-                        
-                        batch_np = np.array(batch, dtype=np.float32)
-                        batch_np = batch_np.reshape((len(batch), *IMG_SIZE, 1))
-                        
-                        # Use call instead of predict for speed
-                        preds = self.eye_model(batch_np, training=False).numpy()
-                        
-                        for i, list_idx in enumerate(eye_indices_map):
-                            pred_idx = np.argmax(preds[i])
-                            direction = CLASS_LABELS[pred_idx]
-                            if list_idx == 0:
-                                left_dir = direction
-                            else:
-                                right_dir = direction
-
-                    last_left_dir = left_dir
-                    last_right_dir = right_dir
-                
-                # -------- CLOSED EYE CHEATING LOGIC (Updated for video time) --------
-                if left_dir == "closed" and right_dir == "closed":
-                    if self.closed_eye_start_time is None:
-                        self.closed_eye_start_time = current_video_time
-                        self.closed_eye_frames = [frame_count]
-                    else:
-                        self.closed_eye_frames.append(frame_count)
-
-                    # Check duration using VIDEO time
-                    if current_video_time - self.closed_eye_start_time >= self.closed_eye_cheat_time:
-                        self.cheating_detected_eye_tilt = True
-                else:
-                    if self.cheating_detected_eye_tilt and self.closed_eye_frames:
-                        self.cheating_frame_list_eye_tilt.append(
-                            (min(self.closed_eye_frames), max(self.closed_eye_frames))
-                        )
-                    self.closed_eye_start_time = None
-                    self.closed_eye_frames = []
-                    self.cheating_detected_eye_tilt = False
-
-                # -------- GAZE (LEFT/RIGHT) CHEATING LOGIC --------
-                is_looking_away = (left_dir in ["left", "right"]) or (right_dir in ["left", "right"])
-                
-                if is_looking_away:
-                    self.gaze_frames.append(frame_count)
-                else:
-                    if self.gaze_frames:
-                        # Check duration
-                        duration = (max(self.gaze_frames) - min(self.gaze_frames)) / fps
-                        if duration >= self.closed_eye_cheat_time:
-                            self.cheating_frame_list_gaze.append(
-                                (min(self.gaze_frames), max(self.gaze_frames))
-                            )
-                        self.gaze_frames = []
-
-            # ---------------- VISUALIZATION ----------------
-            # Draw Face Box
-            if self.last_face_box:
-                x1, y1, x2, y2, cls_name = self.last_face_box
-                color = self.colors.get(cls_name, self.colors["normal"])
-                cv2.rectangle(frame, (x1, y1), (x2, y2), color, 2)
-                cv2.putText(frame, cls_name, (x1, y1 - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.9, color, 2)
-
-            # Draw Eye Boxes and Status
-            for bbox, status, label in [(self.last_left_eye_box, last_left_dir, "L"), (self.last_right_eye_box, last_right_dir, "R")]:
-                if bbox:
-                    ex1, ey1, ex2, ey2 = bbox
-                    color = self.colors["closed"] if status == "closed" else self.colors["normal"]
-                    if status != "center" and status != "closed":
-                         color = self.colors["warning"]
-                    
-                    cv2.rectangle(frame, (ex1, ey1), (ex2, ey2), color, 1)
-                    # Show direction text near eye
-                    cv2.putText(frame, f"{label}:{status}", (ex1, ey1 - 5), cv2.FONT_HERSHEY_SIMPLEX, 0.4, color, 1)
+    # ---------------- RENDERING ----------------
 
-            # Update progress
-            if frame_count % 30 == 0:
-                elapsed = time.time() - start_process_time
-                fps_proc = frame_count / (elapsed + 1e-9)
-                print(f"Frame {frame_count}/{total_frames} | Speed: {fps_proc:.2f} fps", end='\r')
+    def render_intervals(self, session, input_path: str, intervals=None, output_path: str = None,
+                         width: int = None, codec: str = "mp4v"):
+        """
+        Rendering stage, separate from analysis: redraws the overlays of the frames
+        inside `intervals` (seconds, the session's cheating intervals by default)
+        from the session's detection log, and writes only those frames, back
+        to back. `width` scales the output, keeping the aspect ratio; `codec` is a
+        FourCC. Returns (output path, rendered segments), or (None, []) when no
+        interval falls inside the video.
+        """
+        fps = session.fps
+        cap = cv2.VideoCapture(input_path)
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        src_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        src_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
 
-            out.write(frame)
+        if intervals is None:
+            intervals = session.get_cheating_intervals()
+        segments = clamp_cuts(intervals, total_frames / fps) if fps else []
+        if not segments:
+            cap.release()
+            return None, []
 
-        # FLUSH REMAINING INTERVALS
-        if self.cheating_detected_head_tilt and head_tilt_ls:
-            duration = (max(head_tilt_ls) - min(head_tilt_ls)) / fps
-            if duration >= self.closed_eye_cheat_time:
-                self.cheating_frame_list_head_tilt.append(
-                    (min(head_tilt_ls), max(head_tilt_ls))
-                )
-
-        if self.cheating_detected_eye_tilt and self.closed_eye_frames:
-             # Already handled by real-time logic mostly, but good to be safe.
-             # However, the logic for closed eyes is "if duration >= threshold then detected=True"
-             # So if we are here and detected=True, we might need to push.
-             # But the list might have started before and not finished? 
-             # Let's keep consistent logic:
-             duration = (max(self.closed_eye_frames) - min(self.closed_eye_frames)) / fps
-             if duration >= self.closed_eye_cheat_time:
-                 self.cheating_frame_list_eye_tilt.append(
-                    (min(self.closed_eye_frames), max(self.closed_eye_frames))
-                )
-
-        if self.gaze_frames:
-             duration = (max(self.gaze_frames) - min(self.gaze_frames)) / fps
-             if duration >= self.closed_eye_cheat_time:
-                 self.cheating_frame_list_gaze.append(
-                    (min(self.gaze_frames), max(self.gaze_frames))
-                )
+        # Frame k (1-based) is shown at (k - 1) / fps, the timestamp MediaGraph's select sees
+        frame_ranges = [(math.ceil(start * fps) + 1, math.floor(end * fps) + 1) for start, end in segments]
+
+        if width:
+            size = (width + width % 2, round(src_height * width / src_width / 2) * 2)
+        else:
+            size = (src_width, src_height)
+        if output_path is None:
+            output_path = f"extracted_videos/{uuid.uuid4()}_annotated_clips.mp4"
+        os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+        out = cv2.VideoWriter(output_path, cv2.VideoWriter_fourcc(*codec), fps, size)
+
+        # Each frame shows the overlay of the last sampled frame at or before it,
+        # rebuilt from that frame's log row
+        records = session.log.view()
+        frames = records["frame"]
+        extra_faces = self._extra_face_lookup(session)
+        next_row = 0
+        overlay = (None, None, None, "center", "center", ())
+
+        start_render_time = time.time()
+        position = 0  # frames read so far
+        rendered = 0
+        try:
+            for first, last in frame_ranges:
+                # Long gaps are seeked over; short ones are cheaper to grab through
+                if first - 1 - position > 2 * fps:
+                    cap.set(cv2.CAP_PROP_POS_FRAMES, first - 1)
+                    position = first - 1
+                while position < first - 1 and cap.grab():
+                    position += 1
+
+                while position < last:
+                    ret, frame = cap.read()
+                    if not ret:
+                        break
+                    position += 1
+
+                    if next_row < len(frames) and frames[next_row] <= position:
+                        next_row = int(np.searchsorted(frames, position, side="right"))
+                        overlay = self._record_overlay(records[next_row - 1], session.log.face_classes, extra_faces)
+
+                    self._draw_overlays(frame, overlay)
+                    if size != (src_width, src_height):
+                        frame = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+                    out.write(frame)
+                    rendered += 1
+        finally:
+            cap.release()
+            out.release()
+
+        total_time = time.time() - start_render_time
+        print(f"Rendered {rendered} frames of {len(segments)} interval(s) at {size[0]}x{size[1]} in {total_time:.2f}s")
+        return output_path, segments
+
+    def _record_overlay(self, record, face_classes, extra_faces):
+        # The same tuple as DetectionSession.overlay_snapshot() right after this row's frame
+        det = record_detection(record, face_classes)
+        return (det.face_box, det.left_eye_box, det.right_eye_box,
+                DIRECTIONS[record["left_dir"]], DIRECTIONS[record["right_dir"]],
+                extra_faces(det.frame_count, int(record["person"])))
+
+    @staticmethod
+    def _extra_face_lookup(session):
+        """
+        Multi-face sessions: a function giving the (track id, face box) of everyone
+        but `person` in a sampled frame, from the session's face log.
+        """
+        if session.faces_log is None:
+            return lambda frame_count, person: ()
+        records = session.faces_log.view()
+        face_classes = session.faces_log.face_classes
+
+        def extra_faces(frame_count, person):
+            lo, hi = np.searchsorted(records["frame"], [frame_count, frame_count + 1])
+            return tuple((int(record["person"]), record_detection(record, face_classes).face_box)
+                         for record in records[lo:hi] if record["person"] != person)
+        return extra_faces
+
+    def analyze_video(self, input_path: str):
+        """
+        Analysis-only pass: returns the DetectionSession without writing the
+        annotated video. Unsampled frames are only grab()bed, so they are
+        never converted to BGR or copied out of the decoder.
+        """
+        cap = cv2.VideoCapture(input_path)
+        fps = int(cap.get(cv2.CAP_PROP_FPS))
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+
+        # Nothing to draw, so a cache hit does not even decode the video
+        cache_key = self._cache_key(input_path)
+        cached = self._load_cached(cache_key)
+        if cached is not None:
+            cap.release()
+            return self.replay_detections(*cached)
+
+        session = self.new_session(fps)
+        timings = session.stage_timings
+
+        sampler = session.sampler
+        stride = "adaptive sampling" if self.adaptive_sampling else f"every {self.skip_frames}th frame"
+        print(f"Analyzing video: {total_frames} frames @ {fps} fps ({stride})")
+        start_process_time = time.time()
+
+        frame_count = 0
+        analyzed = 0
+        batch = []
+        try:
+            while cap.isOpened():
+                t0 = time.perf_counter()
+                if not cap.grab():
+                    break
+                frame_count += 1
+                session.video_duration = frame_count / fps
+
+                if not sampler.probes(frame_count):
+                    timings["decode"] += time.perf_counter() - t0
+                    continue
+
+                ret, frame = cap.retrieve()
+                timings["decode"] += time.perf_counter() - t0
+                if not ret:
+                    break
+                if not sampler.sample(frame_count, frame):
+                    continue
+
+                analyzed += 1
+                batch.append((frame, frame_count))
+                if len(batch) >= self.yolo_batch_size:
+                    t0 = time.perf_counter()
+                    self._analyze_batch(session, batch)
+                    timings["inference"] += time.perf_counter() - t0
+                    batch = []
+
+                self._report_progress(frame_count, total_frames, start_process_time)
+
+            t0 = time.perf_counter()
+            self._analyze_batch(session, batch)
+            timings["inference"] += time.perf_counter() - t0
+        finally:
+            cap.release()
+            session.close()
+
+        session.flush_intervals()
+        self._save_cached(cache_key, session.log, fps, frame_count)
+
+        total_time = time.time() - start_process_time
+        print(f"\nAnalyzed {analyzed}/{frame_count} frames in {total_time:.2f}s")
+        print("Stage timings: " + ", ".join(f"{k}={v:.2f}s" for k, v in session.stage_timings.items()))
+        self._report_roi(session)
+        if self.adaptive_sampling:
+            print(session.sampler.report(frame_count))
+
+        return session
+
+    def _detect_range(self, input_path: str, start: int, end, warmup: int):
+        """
+        Returns the DetectionLog rows of the sampled frames in [start, end]
+        (1-based, end=None reads to EOF), their face class names and the last
+        frame index read. The `warmup` frames before `start` are run through
+        the models but discarded, so MediaPipe's tracker is settled when the
+        shard begins.
+        """
+        cap = cv2.VideoCapture(input_path)
+        session = self.new_session(int(cap.get(cv2.CAP_PROP_FPS)))
+
+        first = max(1, start - warmup)
+        frame_count = first - 1
+
+        batch = []
+        try:
+            if first > 1:
+                cap.set(cv2.CAP_PROP_POS_FRAMES, first - 1)
+                landed = int(cap.get(cv2.CAP_PROP_POS_FRAMES))
+                if landed != first - 1:
+                    raise SeekMismatch(f"seek to frame {first - 1} landed on {landed}")
+
+            while end is None or frame_count < end:
+                if not cap.grab():
+                    break
+                frame_count += 1
+                if frame_count % self.skip_frames != 0:
+                    continue
 
+                ret, frame = cap.retrieve()
+                if not ret:
+                    break
+
+                batch.append((frame, frame_count))
+                if len(batch) >= self.yolo_batch_size:
+                    self._analyze_batch(session, batch)
+                    batch = []
+
+            self._analyze_batch(session, batch)
+        finally:
+            cap.release()
+            session.close()
+
+        # Warm-up frames only primed MediaPipe's tracker
+        records = session.log.view()
+        return records[records["frame"] >= start], session.log.face_classes, frame_count
+
+    def analyze_video_parallel(self, input_path: str, workers: int = None, overlap_seconds: float = 2.0):
+        """
+        Analysis-only pass split into time shards, one detector per worker
+        process. Workers return their detection log rows and this process
+        finds the intervals over all of them in frame order, so
+        runs crossing a shard boundary are stitched exactly. Each shard starts
+        from a seek and a short warm-up instead of the models' state at that
+        frame, so detections near a boundary can differ slightly from
+        analyze_video(). Modes that carry state from frame to frame, and
+        videos where a seek does not land on the frame asked for, fall back
+        to analyze_video().
+        """
+        cap = cv2.VideoCapture(input_path)
+        fps = int(cap.get(cv2.CAP_PROP_FPS))
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
         cap.release()
-        out.release()
+
+        workers = workers or os.cpu_count() or 1
+        # Adaptive sampling, ROI tracking and face tracking follow state from frame to frame,
+        # so they cannot be sharded
+        if workers <= 1 or total_frames <= 0 or self.adaptive_sampling or self.roi_tracking or self.multi_face:
+            return self.analyze_video(input_path)
+
+        cache_key = self._cache_key(input_path)
+        cached = self._load_cached(cache_key)
+        if cached is not None:
+            return self.replay_detections(*cached)
+
+        shard_len = -(-total_frames // workers)
+        warmup = int(overlap_seconds * fps)
+        shards = []
+        for start in range(1, total_frames + 1, shard_len):
+            end = start + shard_len - 1
+            # The last shard reads to EOF in case CAP_PROP_FRAME_COUNT is short
+            shards.append((input_path, start, end if end < total_frames else None, warmup))
+
+        detector_kwargs = {
+            "eye_closure_threshold": self.eye_closure_threshold,
+            "closed_eye_cheat_time": self.closed_eye_cheat_time,
+            "skip_frames": self.skip_frames,
+            "yolo_batch_size": self.yolo_batch_size,
+            "backend": self.backend,
+            "roi_tracking": self.roi_tracking,
+            "roi_margin": self.roi_margin,
+            "roi_refresh": self.roi_refresh,
+            "multi_face": self.multi_face,
+            "max_faces": self.max_faces
+        }
+
+        print(f"Analyzing video: {total_frames} frames @ {fps} fps in {len(shards)} shards")
+        start_process_time = time.time()
+
+        # spawn, not fork: TensorFlow and torch do not survive fork()
+        ctx = multiprocessing.get_context("spawn")
+        try:
+            with ctx.Pool(len(shards), initializer=_init_shard_worker, initargs=(detector_kwargs,)) as pool:
+                results = pool.map(_detect_shard, shards)
+        except SeekMismatch as e:
+            # Frame numbers past an inexact seek would not line up with a serial run
+            print(f"Cannot shard {input_path} ({e}); analyzing it in one pass")
+            return self.analyze_video(input_path)
+
+        # Only the workers run models; this process just replays their rows in frame order
+        log = DetectionLog()
+        for records, face_classes, _ in results:
+            log.extend(records, face_classes)
+        frame_count = max(last_frame for _, _, last_frame in results)
+        session = self.replay_detections(log, fps, frame_count)
+        self._save_cached(cache_key, session.log, fps, frame_count)
+
         total_time = time.time() - start_process_time
-        print(f"\nProcessed {frame_count} frames in {total_time:.2f}s ({frame_count/total_time:.2f} fps)")
-        
-        return output_path
+        print(f"Analyzed {frame_count} frames in {total_time:.2f}s with {len(shards)} workers")
+
+        return session
 
     def get_cheating_intervals(self):
-        intervals = []
-        if self.fps == 0:
-            return intervals
+        # Last video only, so not meaningful when videos run concurrently; use the returned session there
+        if self.last_session is None:
+            return []
+        return self.last_session.get_cheating_intervals()
 
-        # Include gaze intervals in the merge
-        all_intervals = (
-            self.cheating_frame_list_head_tilt + 
-            self.cheating_frame_list_eye_tilt + 
-            self.cheating_frame_list_gaze
-        )
+# ---------------- MULTI-PROCESS SHARDING ----------------
+# Each worker process owns one detector, created once by the pool initializer.
+_shard_detector = None
 
-        for start, end in all_intervals:
-            if start != end:
-                intervals.append((
-                    max(0, start / self.fps - 10),
-                    min(self.video_duration, end / self.fps + 10)
-                ))
 
-        return MergeIntervals().merge(intervals)
+def _init_shard_worker(detector_kwargs):
+    global _shard_detector
+    # One inference thread per process; the parallelism comes from the shards
+    cv2.setNumThreads(1)
+    if detector_kwargs.get("backend", "native") == "native":
+        import torch
+        import tensorflow as tf
+
+        torch.set_num_threads(1)
+        try:
+            tf.config.threading.set_intra_op_parallelism_threads(1)
+            tf.config.threading.set_inter_op_parallelism_threads(1)
+        except RuntimeError as e:
+            print(f"TensorFlow threading Error: {e}")
+    _shard_detector = MODEL_REGISTRY.get_detector(**detector_kwargs)
+
+
+def _detect_shard(args):
+    input_path, start, end, warmup = args
+    return _shard_detector._detect_range(input_path, start, end, warmup)
+
 
 if __name__ == "__main__":
     detector = SimpleCheatingDetector()
-    detector.process_video("sampled_videos/input_video.mp4", "result_videos/output_video.mp4")
-    print("Merged Cheating Intervals:", detector.get_cheating_intervals())
+    session = detector.process_video("sampled_videos/input_video.mp4")
+    print("Merged Cheating Intervals:", session.get_cheating_intervals())
@@ -0,0 +1,66 @@
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+
+Task = namedtuple("Task", ["name", "fn", "deps", "on_done"])
+
+
+class TaskGraph:
+    """
+    Runs a small DAG of callables on a thread pool, starting each task as soon
+    as all of its dependencies have finished. A task's function receives its
+    dependencies' results as positional arguments, in `deps` order.
+
+    Status messages and on_done callbacks run on the thread that called run(),
+    so UI callbacks such as Streamlit's never execute on a worker thread.
+    """
+
+    def __init__(self, max_workers: int = 4):
+        self.max_workers = max_workers
+        self.tasks = {}
+        # Seconds each task ran for, filled in by run()
+        self.timings = {}
+
+    def add(self, name: str, fn, deps=(), on_done=None):
+        # Dependencies must already be in the graph, which also rules out cycles
+        for dep in deps:
+            if dep not in self.tasks:
+                raise ValueError(f"Task {name!r} depends on unknown task {dep!r}")
+        if name in self.tasks:
+            raise ValueError(f"Duplicate task {name!r}")
+        self.tasks[name] = Task(name, fn, tuple(deps), on_done)
+
+    def run(self, notify=print):
+        """Runs every task and returns {name: result}. The first task error is re-raised."""
+        results = {}
+        pending = dict(self.tasks)
+        running = {}
+        started = {}
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="task") as pool:
+            try:
+                while pending or running:
+                    for name, task in list(pending.items()):
+                        if all(dep in results for dep in task.deps):
+                            del pending[name]
+                            started[name] = time.perf_counter()
+                            running[pool.submit(task.fn, *(results[dep] for dep in task.deps))] = name
+
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        name = running.pop(future)
+                        self.timings[name] = time.perf_counter() - started[name]
+                        results[name] = future.result()
+                        notify(f"[{name}] finished in {self.timings[name]:.2f}s")
+
+                        task = self.tasks[name]
+                        if task.on_done:
+                            task.on_done(results[name])
+            except BaseException:
+                # Tasks already running are waited for when the pool shuts down
+                for future in running:
+                    future.cancel()
+                raise
+
+        return results
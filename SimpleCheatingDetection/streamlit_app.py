@@ -1,9 +1,10 @@
 
 import streamlit as st
 import pandas as pd
+import atexit
 import os
 import time
-from ProcessCheating import ProcessCheating
+from JobQueue import JobService
 
 # Set page config
 st.set_page_config(
@@ -158,107 +159,113 @@ skip_frames = st.sidebar.number_input(
     step=1
 )
 
-# --- Helper to save uploaded files ---
-def save_uploaded_file(uploaded_file):
-    if uploaded_file is not None:
-        save_dir = "temp_uploads"
-        if not os.path.exists(save_dir):
-            os.makedirs(save_dir)
-        file_path = os.path.join(save_dir, uploaded_file.name)
-        with open(file_path, "wb") as f:
-            f.write(uploaded_file.getbuffer())
-        return file_path
-    return None
+annotate = st.sidebar.checkbox("Draw Detection Overlays", value=True)
+render_width = st.sidebar.selectbox(
+    "Overlay Video Width",
+    options=[None, 1280, 854, 640],
+    format_func=lambda width: "Original" if width is None else f"{width}px",
+    disabled=not annotate
+)
+
+# --- Job queue ---
+# Videos are processed by long-lived background workers, so the page stays
+# responsive and every run gets its own working directory under jobs/
+JOBS_ROOT = "jobs"
+JOB_WORKERS = 2
 
-def cleanup_temp_files(file_paths):
-    for path in file_paths:
-        if path and os.path.exists(path):
-            try:
-                os.remove(path)
-            except Exception as e:
-                print(f"Error removing {path}: {e}")
+@st.cache_resource
+def job_service():
+    # One worker pool per Streamlit server, shared by every session
+    service = JobService(JOBS_ROOT, workers=JOB_WORKERS).start()
+    # Workers run in their own process groups, so the server's shutdown signal does not reach them
+    atexit.register(service.stop)
+    return service
 
-# --- Main Processing ---
+queue = job_service().queue
+job_ids = st.session_state.setdefault("job_ids", [])
+
+# --- Submitting ---
 if st.button("Process Video"):
     if teacher_video_file and student_video_file and student_video_pov_file:
-        t_path = None
-        s_path = None
-        s_pov_path = None
-        
-        try:
-            with st.status("Processing videos...", expanded=True) as status:
-                st.write("Uploading files...")
-                # Save files to disk
-                t_path = save_uploaded_file(teacher_video_file)
-                s_path = save_uploaded_file(student_video_file)
-                s_pov_path = save_uploaded_file(student_video_pov_file)
-                
-                results_data = {}
-                def status_update(msg):
-                    if isinstance(msg, list):
-                        results_data['ratings'] = msg
-                        st.write("Interview Rated.")
-                    else:
-                        st.write(msg)
-                
-                # Instantiate ProcessCheating
-                processor = ProcessCheating(
-                    teacher_audio_video_path=t_path,
-                    student_audio_video_path=s_path,
-                    student_audio_video_path_second_pov=s_pov_path,
-                    eye_closure_threshold=eye_closure_threshold,
-                    closed_eye_cheat_time=closed_eye_cheat_time,
-                    skip_frames=skip_frames
-                )
-                
-                # Run with callback
-                processor.run(status_callback=status_update)
-                
-                status.update(label="Processing Complete!", state="complete", expanded=False)
-                
-            st.success("Processing Complete!")
-            st.info("Check 'final_videos' folder for results if not displayed below.")
-
-            if 'ratings' in results_data and results_data['ratings']:
-                st.subheader("Interview Ratings")
-                df = pd.DataFrame(results_data['ratings'])
-                # Rename columns to match user request (replace underscores with spaces)
-                df.columns = [col.replace('_', ' ') for col in df.columns]
-                st.dataframe(df, use_container_width=True)
-            
-            # Try to find the latest files in final_videos
-            if os.path.exists("final_videos"):
-                files = sorted([f for f in os.listdir("final_videos") if f.endswith(".mp4")], 
-                               key=lambda x: os.path.getmtime(os.path.join("final_videos", x)), 
-                               reverse=True)
-                if files:
-                    st.subheader("Results")
-                    cols = st.columns(2)
-                    for i, f in enumerate(files):
-                        with cols[i % 2]:
-                            st.write(f"**{f}**")
-                            file_path = os.path.join("final_videos", f)
-                            st.video(file_path)
-                            with open(file_path, "rb") as video_file:
-                                st.download_button(
-                                    label=f"Download {f}",
-                                    data=video_file,
-                                    file_name=f,
-                                    mime="video/mp4"
-                                )
-                else:
-                    st.warning("No output videos found in 'final_videos' folder.")
-                
-        except Exception as e:
-            st.error(f"An error occurred: {e}")
-            st.exception(e)
-        finally:
-            # Cleanup
-            cleanup_temp_files([t_path, s_path, s_pov_path])
-            os.rmdir("temp_uploads") if os.path.exists("temp_uploads") and not os.listdir("temp_uploads") else None
-            
+        job_id = queue.submit(
+            {
+                "eye_closure_threshold": eye_closure_threshold,
+                "closed_eye_cheat_time": closed_eye_cheat_time,
+                "skip_frames": skip_frames,
+                "annotate": annotate,
+                "render_width": render_width
+            },
+            inputs={
+                "teacher_audio_video_path": (teacher_video_file.name, teacher_video_file.getbuffer()),
+                "student_audio_video_path": (student_video_file.name, student_video_file.getbuffer()),
+                "student_audio_video_path_second_pov": (student_video_pov_file.name, student_video_pov_file.getbuffer())
+            }
+        )
+        job_ids.insert(0, job_id)
+        st.success(f"Job {job_id[:8]} queued.")
     else:
         st.error("Please upload all three video files.")
 
+# --- Polling ---
+def show_results(job):
+    result = job.result
+    st.write(f"Cheating detected in intervals: {result['cheating_intervals']}")
+
+    if result["ratings"]:
+        st.subheader("Interview Ratings")
+        df = pd.DataFrame(result["ratings"])
+        # Rename columns to match user request (replace underscores with spaces)
+        df.columns = [col.replace('_', ' ') for col in df.columns]
+        st.dataframe(df, use_container_width=True)
+
+    videos = [path for path in result["outputs"].values() if os.path.exists(path)]
+    if not videos:
+        st.warning("No output videos were produced for this job.")
+    cols = st.columns(2)
+    for i, file_path in enumerate(videos):
+        f = os.path.basename(file_path)
+        with cols[i % 2]:
+            st.write(f"**{f}**")
+            st.video(file_path)
+            with open(file_path, "rb") as video_file:
+                st.download_button(
+                    label=f"Download {f}",
+                    data=video_file,
+                    file_name=f,
+                    mime="video/mp4",
+                    key=f"download-{file_path}"
+                )
+
+if job_ids:
+    st.subheader("Jobs")
+    active = False
+    for job_id in job_ids:
+        job = queue.get(job_id)
+        if job is None:
+            continue
+        active = active or job.status in ("queued", "running")
+
+        with st.expander(f"Job {job.id[:8]} — {job.status}", expanded=job.status != "cancelled"):
+            if job.status == "queued":
+                st.info("Waiting for a free worker...")
+            elif job.status == "running":
+                st.info(job.progress or "Starting...")
+            elif job.status == "done":
+                show_results(job)
+            elif job.status == "failed":
+                st.error(f"An error occurred: {job.error}")
+            else:
+                st.warning("Cancelled.")
+
+            if job.status in ("queued", "running") and not job.cancel_requested:
+                if st.button("Cancel", key=f"cancel-{job.id}"):
+                    queue.cancel(job.id)
+                    st.rerun()
+
+    # Poll until every job of this session has finished
+    if active:
+        time.sleep(2)
+        st.rerun()
+
 st.markdown("---")
 st.markdown("Cheating Detection Dashboard")
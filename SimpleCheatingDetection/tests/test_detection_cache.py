@@ -0,0 +1,48 @@
+import os
+
+import numpy as np
+
+from DetectionCache import DetectionCache
+from DetectionLog import DetectionLog, RECORD_DTYPE
+
+
+def make_log(rows):
+    log = DetectionLog()
+    records = np.zeros(rows, dtype=RECORD_DTYPE)
+    records["frame"] = np.arange(rows)
+    log.extend(records, ["phone"])
+    return log
+
+
+def age(cache, key, seconds_ago):
+    path = cache._path(key)
+    mtime = os.path.getmtime(path) - seconds_ago
+    os.utime(path, (mtime, mtime))
+
+
+def test_save_evicts_least_recently_used(tmp_path):
+    cache = DetectionCache(str(tmp_path))
+    cache.save("a", make_log(500), 30.0, 3000)
+    entry_bytes = os.path.getsize(cache._path("a"))
+    cache.max_bytes = int(entry_bytes * 2.5)
+
+    cache.save("b", make_log(500), 30.0, 3000)
+    age(cache, "a", 20)
+    age(cache, "b", 10)
+    # A hit makes "a" the most recently used, so "b" goes first
+    assert cache.load("a") is not None
+    cache.save("c", make_log(500), 30.0, 3000)
+
+    assert cache.load("b") is None
+    log, fps, frame_count = cache.load("a")
+    assert len(log) == 500 and fps == 30.0 and frame_count == 3000
+    assert cache.load("c") is not None
+    assert sorted(os.listdir(tmp_path)) == ["a.npz", "c.npz"]
+
+
+def test_entries_within_the_cap_are_kept(tmp_path):
+    cache = DetectionCache(str(tmp_path))
+    for key in "abc":
+        cache.save(key, make_log(100), 25.0, 1000)
+    assert all(cache.load(key) is not None for key in "abc")
+    assert cache.stats() == {"hits": 3, "misses": 0}
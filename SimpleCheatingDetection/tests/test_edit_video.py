@@ -0,0 +1,54 @@
+import subprocess
+
+import cv2
+import numpy as np
+import pytest
+
+from EditVideo import Video
+from MediaGraph import ffmpeg_exe
+
+CUTS = [(1.5, 4.2), (6.0, 9.7)]
+
+
+def make_clip(path, x264_params):
+    # Moving test pattern with B-frames; keyframes every 1.5 s so every cut has copied GOPs
+    subprocess.run(
+        [ffmpeg_exe(), "-loglevel", "error", "-y",
+         "-f", "lavfi", "-i", "testsrc2=size=160x120:rate=30",
+         "-f", "lavfi", "-i", "sine=f=440:sample_rate=44100", "-t", "12",
+         "-c:v", "libx264", "-g", "45", "-bf", "3", "-x264-params", x264_params,
+         "-c:a", "aac", str(path)],
+        check=True
+    )
+    return str(path)
+
+
+def read_frames(path):
+    cap = cv2.VideoCapture(path)
+    frames = []
+    while True:
+        ok, frame = cap.read()
+        if not ok:
+            break
+        frames.append(frame.astype(np.int16))
+    cap.release()
+    return frames
+
+
+@pytest.mark.parametrize("x264_params", ["b-pyramid=none", "b-pyramid=normal"])
+def test_smart_cut_keeps_b_frames_in_place(tmp_path, x264_params):
+    source = make_clip(tmp_path / "source.mp4", x264_params)
+    output = Video()._smart_cut(source, str(tmp_path / "cut.mp4"), CUTS)
+    assert output is not None
+
+    full = read_frames(source)
+    expected = [full[k] for k in range(len(full)) if any(start <= k / 30 < end for start, end in CUTS)]
+    got = read_frames(output)
+    assert len(got) == len(expected)
+    # Edges are re-encoded near-lossless; a frame out of place differs by far more
+    assert max(np.abs(a - b).mean() for a, b in zip(expected, got)) < 3
+
+
+def test_smart_cut_falls_back_on_open_gops(tmp_path):
+    source = make_clip(tmp_path / "source.mp4", "open-gop=1")
+    assert Video()._smart_cut(source, str(tmp_path / "cut.mp4"), CUTS) is None
@@ -0,0 +1,59 @@
+import subprocess
+
+import pytest
+
+from ExtractAudio import Audio
+from MediaGraph import ffmpeg_exe, probe
+
+
+def make_clip(path, seconds, frequency, faststart=False):
+    command = [ffmpeg_exe(), "-loglevel", "error", "-y",
+               "-f", "lavfi", "-i", "testsrc=size=160x120:rate=15",
+               "-f", "lavfi", "-i", f"sine=f={frequency}:sample_rate=44100",
+               "-t", str(seconds), "-c:v", "libx264", "-c:a", "aac"]
+    if faststart:
+        command += ["-movflags", "+faststart"]
+    subprocess.run(command + [str(path)], check=True)
+    return str(path)
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    # mix_audio writes under final_audio/ in the working directory
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+def test_mix_is_as_long_as_first_track(workdir):
+    first = make_clip(workdir / "first.mp4", 6, 440)
+    second = make_clip(workdir / "second.mp4", 12, 220)
+    mixed = Audio().mix_audio(first, second)
+    assert abs(probe(mixed).duration - 6) < 0.2
+
+
+@pytest.mark.parametrize("truncated_first", [True, False])
+def test_truncated_track_raises(workdir, truncated_first):
+    whole = make_clip(workdir / "whole.mp4", 20, 440, faststart=True)
+    healthy = make_clip(workdir / "healthy.mp4", 20, 220)
+    # The header still says 20 s, but only the first part of the media data is left
+    data = (workdir / "whole.mp4").read_bytes()
+    (workdir / "cut.mp4").write_bytes(data[:len(data) * 3 // 10])
+    assert probe(str(workdir / "cut.mp4")).duration == pytest.approx(probe(whole).duration)
+
+    cut = str(workdir / "cut.mp4")
+    with pytest.raises(RuntimeError, match="cut.mp4"):
+        if truncated_first:
+            Audio().mix_audio(cut, healthy)
+        else:
+            Audio().mix_audio(healthy, cut)
+
+
+def test_decoder_failure_raises_its_stderr(workdir, monkeypatch):
+    first = make_clip(workdir / "first.mp4", 3, 440)
+    second = make_clip(workdir / "second.mp4", 3, 220)
+    audio = Audio()
+    decode = audio._decode_pcm
+    monkeypatch.setattr(audio, "_decode_pcm",
+                        lambda path, *args: decode(str(workdir / "missing.mp4") if path == second else path, *args))
+    with pytest.raises(RuntimeError, match="missing.mp4"):
+        audio.mix_audio(first, second)
@@ -0,0 +1,80 @@
+import random
+
+import numpy as np
+import pytest
+
+from IntervalEngine import IntervalEngine, detection_signals
+from SimpleCheatingDetector import DetectionSession, FrameDetection
+
+
+def random_stream(rng):
+    """Detection stream with signals that hold for a while, so runs of every length show up."""
+    fps = rng.choice([24, 25, 30, 29.97])
+    skip = rng.choice([1, 3, 6])
+    cheat_time = rng.choice([0.5, 1.0, 4.0])
+    threshold = rng.choice([0.005, 0.009, 0.02])
+    detections = []
+    tilt, heights, probs = False, [0.02, 0.02], [None, None]
+    for frame in range(skip, rng.randint(0, 3000), skip):
+        if rng.random() < 0.1:
+            tilt = not tilt
+        if rng.random() < 0.1:
+            heights = [rng.uniform(0, 0.03) for _ in range(2)]
+        if rng.random() < 0.1:
+            probs = [None if rng.random() < 0.1 else tuple(np.float32([rng.random() for _ in range(3)]).tolist())
+                     for _ in range(2)]
+        if rng.random() < 0.05:
+            detections.append(FrameDetection(frame, tilt, None, None, None, None, None, None, None))
+        else:
+            detections.append(FrameDetection(frame, tilt, None, (0, 0, 1, 1), (0, 0, 1, 1), *heights, *probs))
+    return fps, cheat_time, threshold, detections
+
+
+def run_session(fps, cheat_time, threshold, detections):
+    session = DetectionSession(cheat_time, fps, eye_closure_threshold=threshold)
+    for det in detections:
+        session.apply_detection(det)
+    session.video_duration = (detections[-1].frame_count if detections else 0) / fps
+    session.flush_intervals()
+    return session
+
+
+def as_tuples(intervals):
+    return [tuple(iv) for iv in intervals.tolist()]
+
+
+@pytest.mark.parametrize("seed", range(500))
+def test_engine_matches_session(seed):
+    fps, cheat_time, threshold, detections = random_stream(random.Random(seed))
+    session = run_session(fps, cheat_time, threshold, detections)
+
+    engine = IntervalEngine(fps, cheat_time, threshold)
+    signals = detection_signals(detections)
+    head, closed_eye, gaze = engine.frame_intervals(*signals)
+    assert as_tuples(head) == session.cheating_frame_list_head_tilt
+    assert as_tuples(closed_eye) == session.cheating_frame_list_eye_tilt
+    assert as_tuples(gaze) == session.cheating_frame_list_gaze
+    assert engine.cheating_intervals(*signals, session.video_duration) == session.get_cheating_intervals()
+
+
+@pytest.mark.parametrize("seed", range(0, 500, 10))
+def test_log_intervals_match_signals(seed):
+    fps, cheat_time, threshold, detections = random_stream(random.Random(seed))
+    session = run_session(fps, cheat_time, threshold, detections)
+
+    engine = IntervalEngine(fps, cheat_time, threshold)
+    expected = engine.frame_intervals(*detection_signals(detections))
+    assert [iv.tolist() for iv in engine.log_intervals(session.log)] == [iv.tolist() for iv in expected]
+
+
+def test_empty_stream():
+    engine = IntervalEngine(30, 1.0)
+    head, closed_eye, gaze = engine.frame_intervals(*detection_signals([]))
+    assert head.shape == closed_eye.shape == gaze.shape == (0, 2)
+    assert engine.cheating_intervals(*detection_signals([]), 0.0) == []
+
+
+def test_runs():
+    starts, ends = IntervalEngine.runs([False, True, True, False, True])
+    assert starts.tolist() == [1, 4]
+    assert ends.tolist() == [2, 4]
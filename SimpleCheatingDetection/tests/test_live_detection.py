@@ -0,0 +1,96 @@
+import threading
+import time
+
+import cv2
+import numpy as np
+import pytest
+
+from LiveDetection import FileCamera, LiveDetector
+from SimpleCheatingDetector import DetectionSession, FrameDetection
+
+
+class StubDetector:
+    """Models replaced by a fixed delay per batch; records what reached them and how long the queue got."""
+
+    def __init__(self, live_ref, delay, yolo_batch_size=2):
+        self.live_ref = live_ref
+        self.delay = delay
+        self.skip_frames = 1
+        self.yolo_batch_size = yolo_batch_size
+        self.analyzed = []
+        self.max_waiting = 0
+
+    def new_session(self, fps):
+        return DetectionSession(1.0, fps)
+
+    def detect_frames(self, session, batch):
+        live = self.live_ref[0]
+        with live._cond:
+            self.max_waiting = max(self.max_waiting, len(live._waiting))
+        time.sleep(self.delay)
+        self.analyzed.extend(frame_count for _, frame_count in batch)
+        return [FrameDetection(frame_count, False, None, None, None, None, None, None, None)
+                for _, frame_count in batch]
+
+
+@pytest.fixture
+def video(tmp_path):
+    path = str(tmp_path / "clip.avi")
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), 30, (64, 48))
+    for i in range(120):
+        writer.write(np.full((48, 64, 3), i * 2, dtype=np.uint8))
+    writer.release()
+    return path
+
+
+def live_detector(delay, **kwargs):
+    ref = []
+    detector = StubDetector(ref, delay)
+    live = LiveDetector(detector, fps=30.0, **kwargs)
+    ref.append(live)
+    return live, detector
+
+
+def test_queue_stays_bounded(video):
+    live, detector = live_detector(0.02, max_queue=3, max_latency=60.0)
+    session = live.run(FileCamera(video, speed=None))
+
+    stats = live.stats
+    assert stats["received"] == stats["sampled"] == 120
+    assert detector.max_waiting <= 3
+    # Only the queue bound dropped frames; everything else was analyzed, in order
+    assert stats["dropped"] > 0
+    assert stats["analyzed"] + stats["dropped"] == stats["sampled"]
+    assert detector.analyzed == sorted(detector.analyzed)
+    # Whatever was still waiting at stop() is analyzed, up to the last frame
+    assert detector.analyzed[-1] == 120
+    assert session.video_duration == pytest.approx(4.0)
+
+
+def test_stale_frames_are_dropped(video):
+    # Frames arrive at 120 fps and each batch of two takes 0.1 s, so the queue falls behind fast
+    live, detector = live_detector(0.1, max_queue=1000, max_latency=0.05)
+    live.run(FileCamera(video, speed=4.0))
+
+    stats = live.stats
+    assert stats["dropped"] > 0
+    assert stats["analyzed"] + stats["dropped"] == stats["sampled"] == 120
+    # Without the latency cut the last frames would wait for seconds
+    assert stats["max_latency"] <= 0.05 + 0.1 + 0.1
+
+
+def test_stop_without_start_is_a_no_op():
+    live, _ = live_detector(0.0)
+    assert live.stop() is None
+
+
+def test_stop_twice():
+    live, _ = live_detector(0.0, max_queue=20)
+    live.start()
+    frame = np.zeros((48, 64, 3), dtype=np.uint8)
+    for i in range(1, 11):
+        live.push(frame, i / 30.0)
+    session = live.stop()
+    assert session is not None and live.stats["analyzed"] == 10
+    assert live.stop() is None
+    assert not any(t.name == "live-detector" for t in threading.enumerate())
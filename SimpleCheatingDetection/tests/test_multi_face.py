@@ -0,0 +1,68 @@
+from FaceTracking import FaceTracker
+from SimpleCheatingDetector import DetectionSession, FrameDetection, SimpleCheatingDetector
+
+FPS = 10
+LOOKING_LEFT = (0.0, 1.0, 0.0)
+LOOKING_AHEAD = (1.0, 0.0, 0.0)
+
+
+def face(frame_count, x, probs):
+    box = (x, 0, x + 50, 50, "normal")
+    return FrameDetection(frame_count, False, box, (x, 10, x + 10, 20), (x + 20, 10, x + 30, 20),
+                          0.02, 0.02, probs, probs)
+
+
+def run(frames, visitors):
+    """
+    The candidate sits still at x=0 for `frames` frames; a visitor steps in every
+    20 frames for 5 frames, each at a new spot so the tracker gives them a new ID.
+    visitors(n) is the eye-model output of visitor n.
+    """
+    session = DetectionSession(1.0, FPS)
+    session.tracker = FaceTracker(max_age=2 * FPS)
+    for frame_count in range(1, frames + 1):
+        faces = [face(frame_count, 0, LOOKING_AHEAD)]
+        visitor = frame_count // 20
+        if frame_count % 20 < 5:
+            faces.append(face(frame_count, 100 * (visitor + 1), visitors(visitor)))
+        ids = session.tracker.update(frame_count, [f.face_box for f in faces])
+        person_id = session.tracker.primary()
+        entries = tuple(zip(ids, faces))
+        det = dict(entries)[person_id]._replace(faces=entries, person_id=person_id)
+        session.video_duration = frame_count / FPS
+        session.apply_detection(det)
+    session.flush_intervals()
+    return session
+
+
+def test_retired_tracks_are_dropped():
+    session = run(4000, lambda n: LOOKING_AHEAD)
+    # 200 visitors came and went; only the candidate and the visitors seen within max_age are held
+    assert session.tracker.next_id > 200
+    assert len(session.tracks) <= 3
+    assert session.retired_tracks == {}
+    assert len(session.cheating_frame_list_extra_person) == 0
+
+
+def test_retired_track_keeps_its_runs():
+    # The visitor looks away for their whole one-second stay, longer than the 0.3 s cheat time
+    session = DetectionSession(0.3, FPS)
+    session.tracker = FaceTracker(max_age=2 * FPS)
+    for frame_count in range(1, 200):
+        faces = [face(frame_count, 0, LOOKING_AHEAD)]
+        if frame_count <= 10:
+            faces.append(face(frame_count, 200, LOOKING_LEFT))
+        ids = session.tracker.update(frame_count, [f.face_box for f in faces])
+        entries = tuple(zip(ids, faces))
+        session.apply_detection(faces[0]._replace(faces=entries, person_id=session.tracker.primary()))
+    assert list(session.tracks) == [0]
+    assert list(session.retired_tracks) == [1]
+    assert session.retired_tracks[1].cheating_frame_list_gaze == [(1, 10)]
+
+
+def test_extra_faces_come_from_the_face_log():
+    session = run(60, lambda n: LOOKING_AHEAD)
+    extra_faces = SimpleCheatingDetector._extra_face_lookup(session)
+    assert extra_faces(2, 0) == ((1, (100, 0, 150, 50, "normal")),)
+    assert extra_faces(10, 0) == ()
+    assert extra_faces(41, 0) == ((3, (300, 0, 350, 50, "normal")),)
@@ -0,0 +1,126 @@
+import json
+import re
+import subprocess
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from openai import InternalServerError
+
+import OpenAI_Rating
+from MediaGraph import ffmpeg_exe
+from OpenAI_Rating import InterviewRater
+
+
+class StubWhisper(ThreadingHTTPServer):
+    """
+    Local stand-in for the transcription endpoint. Chunks are told apart by
+    their upload name (0000.mp3, 0001.mp3, ...). `failures[i]` is how many
+    times chunk i answers 500 before it succeeds (-1: always), and `delays[i]`
+    holds its reply back so replies can come back out of order.
+    """
+
+    def __init__(self, failures=None, delays=None):
+        super().__init__(("127.0.0.1", 0), StubHandler)
+        self.failures = dict(failures or {})
+        self.delays = dict(delays or {})
+        self.attempts = {}
+        self.finished = []
+        self.lock = threading.Lock()
+
+    def reply(self, chunk):
+        with self.lock:
+            self.attempts[chunk] = self.attempts.get(chunk, 0) + 1
+            left = self.failures.get(chunk, 0)
+            if left:
+                self.failures[chunk] = left - 1 if left > 0 else left
+                return 500, {"error": {"message": f"chunk {chunk} failed", "type": "server_error"}}
+        threading.Event().wait(self.delays.get(chunk, 0))
+        with self.lock:
+            self.finished.append(chunk)
+        text = f"chunk {chunk}"
+        return 200, {"task": "transcribe", "language": "english", "duration": 1.0, "text": text,
+                     "segments": [{"id": 0, "seek": 0, "start": 0.25, "end": 0.75, "text": text, "tokens": [],
+                                   "temperature": 0.0, "avg_logprob": 0.0, "compression_ratio": 1.0,
+                                   "no_speech_prob": 0.0}]}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        chunk = int(re.search(rb'filename="(\d+)\.mp3"', body).group(1))
+        status, payload = self.server.reply(chunk)
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def audio(tmp_path):
+    # 10 s with a quiet gap every 2.5 s, so a 3 s chunk length gives four chunks
+    path = tmp_path / "interview.mp3"
+    subprocess.run([ffmpeg_exe(), "-loglevel", "error", "-y", "-f", "lavfi",
+                    "-i", "aevalsrc='sin(440*2*PI*t)*gt(mod(t,2.5),0.3)':s=16000:d=10",
+                    "-c:a", "libmp3lame", str(path)], check=True)
+    return str(path)
+
+
+@pytest.fixture
+def delays(monkeypatch):
+    # Backoff delays are recorded instead of slept
+    slept = []
+    monkeypatch.setattr(OpenAI_Rating.time, "sleep", slept.append)
+    return slept
+
+
+def transcribe(server, audio, max_retries=3):
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        rater = InterviewRater(api_key="test", base_url=f"http://127.0.0.1:{server.server_port}/v1",
+                               chunk_seconds=3.0, max_concurrency=4, max_retries=max_retries, cache=None)
+        return rater.get_transcription_segments(audio)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_chunks_are_reassembled_in_order(audio, delays):
+    # The first chunk answers last
+    server = StubWhisper(delays={0: 0.5})
+    segments = transcribe(server, audio)
+
+    assert len(segments) == 4
+    assert server.finished[-1] == 0
+    assert [s["text"] for s in segments] == [f"chunk {i}" for i in range(4)]
+    # Times are shifted from each chunk onto the whole file
+    starts = [s["start"] for s in segments]
+    assert starts == sorted(starts)
+    assert starts[0] == pytest.approx(0.25)
+    assert all(s["end"] <= 10.0 for s in segments)
+    assert delays == []
+
+
+def test_failed_chunk_is_retried(audio, delays):
+    server = StubWhisper(failures={1: 2})
+    segments = transcribe(server, audio)
+
+    assert [s["text"] for s in segments] == [f"chunk {i}" for i in range(4)]
+    assert server.attempts[1] == 3
+    assert all(server.attempts[i] == 1 for i in (0, 2, 3))
+    assert delays == [1, 2]
+
+
+def test_retries_run_out(audio, delays):
+    server = StubWhisper(failures={2: -1})
+    with pytest.raises(InternalServerError):
+        transcribe(server, audio, max_retries=2)
+
+    assert server.attempts[2] == 3
+    assert delays == [1, 2]
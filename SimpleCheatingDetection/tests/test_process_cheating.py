@@ -0,0 +1,125 @@
+import threading
+import time
+
+import pytest
+
+import ProcessCheating as process_cheating
+from ProcessCheating import ProcessCheating
+
+
+class Recorder:
+    """Ordered start/end events from every stub, whichever thread they ran on."""
+
+    def __init__(self):
+        self.events = []
+        self.lock = threading.Lock()
+
+    def step(self, name, result=None, fail=None, delay=0.02):
+        with self.lock:
+            self.events.append(("start", name))
+        time.sleep(delay)
+        if fail is not None and fail == name:
+            raise RuntimeError(f"{name} failed")
+        with self.lock:
+            self.events.append(("end", name))
+        return result
+
+    def index(self, kind, name):
+        return self.events.index((kind, name))
+
+    def before(self, dep, task):
+        return self.index("end", dep) < self.index("start", task)
+
+
+class StubSession:
+    def get_cheating_intervals(self):
+        return [(1.0, 2.0)]
+
+
+class StubDetector:
+    startup_time = 0.0
+
+    def __init__(self, recorder, fail):
+        self.recorder = recorder
+        self.fail = fail
+
+    def analyze_video(self, path):
+        return self.recorder.step("detect", StubSession(), self.fail)
+
+    def render_intervals(self, session, path, width=None, codec=None):
+        return self.recorder.step("annotate", ("annotated.mp4", [(0.0, 1.0)]), self.fail)
+
+
+class StubAudio:
+    def __init__(self, recorder, fail):
+        self.recorder = recorder
+        self.fail = fail
+
+    def mix_audio(self, video1_path, video2_path):
+        return self.recorder.step("mix_audio", "mixed.mp3", self.fail)
+
+
+class StubMediaGraph:
+    def __init__(self, recorder, fail):
+        self.recorder = recorder
+        self.fail = fail
+
+    def render_interview(self, **kwargs):
+        return self.recorder.step("render", {"final": "final.mp4"}, self.fail)
+
+
+class StubRater:
+    def __init__(self, recorder, fail):
+        self.recorder = recorder
+        self.fail = fail
+        self.audio_paths = []
+
+    def rate_interview(self, audio_path, role):
+        self.audio_paths.append(audio_path)
+        return self.recorder.step("rate_interview", [{"question_rating": 4}], self.fail)
+
+
+@pytest.fixture
+def pipeline(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+    def build(fail=None):
+        recorder = Recorder()
+        monkeypatch.setattr(process_cheating, "Audio", lambda: StubAudio(recorder, fail))
+        monkeypatch.setattr(process_cheating.MODEL_REGISTRY, "get_detector",
+                            lambda **kwargs: recorder.step("load_models", StubDetector(recorder, fail), fail))
+        monkeypatch.setattr(process_cheating, "MediaGraph", lambda: StubMediaGraph(recorder, fail))
+        rater = StubRater(recorder, fail)
+        return ProcessCheating(rater=rater), recorder, rater
+
+    return build
+
+
+def test_tasks_run_in_dependency_order(pipeline):
+    process, recorder, rater = pipeline()
+    messages = []
+    result = process.run(status_callback=messages.append)
+
+    assert recorder.before("mix_audio", "rate_interview")
+    assert recorder.before("load_models", "detect")
+    assert recorder.before("detect", "annotate")
+    for dep in ("detect", "annotate", "mix_audio"):
+        assert recorder.before(dep, "render")
+    # The audio and video branches do not wait for each other
+    assert recorder.index("start", "load_models") < recorder.index("end", "mix_audio")
+
+    assert rater.audio_paths == ["mixed.mp3"]
+    assert result["ratings"] == [{"question_rating": 4}]
+    assert result["cheating_intervals"] == [(1.0, 2.0)]
+    assert result["outputs"] == {"final": "final.mp4"}
+    assert "Processing Complete." in messages
+
+
+@pytest.mark.parametrize("failing", ["mix_audio", "rate_interview", "load_models", "detect", "annotate", "render"])
+def test_task_failure_reaches_caller(pipeline, failing):
+    process, recorder, _ = pipeline(fail=failing)
+    with pytest.raises(RuntimeError, match=f"{failing} failed"):
+        process.run()
+    # Nothing that depends on the failed task started
+    if failing in ("mix_audio", "detect", "annotate"):
+        assert ("start", "render") not in recorder.events